@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the batch bcrypt helpers in encrypt_password.
+
+Hashes and verifies the same passwords with 1, 2, 4, ... worker
+threads, up to the number of cores, and reports the throughput.
+
+    Usage: ./bench_bcrypt.py [passwords]
+"""
+import os
+import sys
+import time
+
+from encrypt_password import hash_passwords_batch, verify_batch
+
+
+def main():
+    """Run the benchmark."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    passwords = [f"MyAmazingPassw0rd{i}" for i in range(count)]
+    cores = os.cpu_count() or 1
+    print(f"{count} passwords, {cores} cores")
+
+    workers = 1
+    while True:
+        start = time.perf_counter()
+        hashes = hash_passwords_batch(passwords, workers=workers)
+        hashed = time.perf_counter() - start
+        start = time.perf_counter()
+        results = verify_batch(zip(hashes, passwords), workers=workers)
+        verified = time.perf_counter() - start
+        assert all(results)
+        print(f"workers={workers:<3} hash {count / hashed:8.1f}/s "
+              f"verify {count / verified:8.1f}/s")
+        if workers >= cores:
+            break
+        workers = min(workers * 2, cores)
+
+
+if __name__ == '__main__':
+    main()
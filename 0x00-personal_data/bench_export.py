@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the partitioned, multi-process users export.
+
+Builds a synthetic users table in a local SQLite database, then times
+parallel_export with an increasing number of workers and reports the
+speedup over a single worker.
+
+    Usage: ./bench_export.py [rows] [max_workers]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from functools import partial
+
+from filtered_logger import parallel_export
+
+
+def build_table(db_path: str, rows: int):
+    """Create and fill a users table with `rows` synthetic users."""
+    connection = sqlite3.connect(db_path)
+    connection.execute("DROP TABLE IF EXISTS users")
+    connection.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, "
+                       "name TEXT, email TEXT, phone TEXT, ssn TEXT, "
+                       "password TEXT, ip TEXT, last_login TEXT, "
+                       "user_agent TEXT)")
+    connection.executemany(
+        "INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ((i, f"user{i}", f"user{i}@example.com", f"555-{i:07d}",
+          f"{i:09d}", f"hash{i}", f"10.0.{i % 256}.{i // 256 % 256}",
+          "2019-11-14 06:16:24", "Mozilla/5.0 (Windows NT 10.0)")
+         for i in range(rows)))
+    connection.commit()
+    connection.close()
+
+
+def main():
+    """Run the benchmark."""
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "users.db")
+        start = time.perf_counter()
+        build_table(db_path, rows)
+        print(f"built {rows:,} rows in {time.perf_counter() - start:.1f}s")
+
+        connect = partial(sqlite3.connect, db_path)
+        baseline = None
+        workers = 1
+        while workers <= max_workers:
+            with open(os.devnull, "w") as devnull:
+                start = time.perf_counter()
+                parallel_export(connect, workers, key="id", output=devnull,
+                                placeholder="?")
+                elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"workers={workers:<3} {elapsed:8.2f}s "
+                  f"{rows / elapsed:>12,.0f} rows/s "
+                  f"speedup {baseline / elapsed:.2f}x")
+            workers *= 2
+
+
+if __name__ == '__main__':
+    main()
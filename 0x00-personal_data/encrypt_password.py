@@ -2,17 +2,43 @@
 """Using bcrypt, this module defines a
    function that encrypt a password and
    return a salted, hashed password.
+
+   bcrypt releases the GIL while hashing, so the async and batch
+   variants run the work on a bounded pool of threads.
+
+   The bcrypt cost is calibrated on first use: the largest cost that
+   hashes within BCRYPT_LATENCY_BUDGET seconds on this machine, unless
+   BCRYPT_ROUNDS pins it. Either way it is never below
+   BCRYPT_MIN_ROUNDS (12, bcrypt's default), whatever the machine.
 """
 
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
 import bcrypt
 
+MAX_WORKERS = os.cpu_count() or 1
+MIN_ROUNDS = 4
+DEFAULT_MIN_ROUNDS = 12
+MAX_ROUNDS = 31
+DEFAULT_LATENCY_BUDGET = 0.25
+
+_executor = None
+_executor_lock = threading.Lock()
+_rounds = None
+_rounds_lock = threading.Lock()
+
 
 def hash_password(password: str) -> bytes:
     """Hashes a password using bcrypt and
        return the hashed password as bytes
     """
-    # Generate a salt and hash the password
-    salt = bcrypt.gensalt()
+    # Generate a salt at the calibrated cost and hash the password
+    salt = bcrypt.gensalt(rounds=get_rounds())
     hashed_password = bcrypt.hashpw(password.encode(), salt)
     return hashed_password
 
@@ -23,3 +49,123 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
     """
 
     return bcrypt.checkpw(password.encode(), hashed_password)
+
+
+def min_rounds() -> int:
+    """Return the lowest bcrypt cost allowed,
+       BCRYPT_MIN_ROUNDS or DEFAULT_MIN_ROUNDS.
+    """
+    minimum = int(os.getenv("BCRYPT_MIN_ROUNDS", DEFAULT_MIN_ROUNDS))
+    return min(max(minimum, MIN_ROUNDS), MAX_ROUNDS)
+
+
+def calibrate_rounds(budget: Optional[float] = None) -> int:
+    """Return the largest bcrypt cost whose hashing time
+       fits within `budget` seconds on this machine,
+       but at least min_rounds().
+    """
+    if budget is None:
+        budget = float(os.getenv("BCRYPT_LATENCY_BUDGET",
+                                 DEFAULT_LATENCY_BUDGET))
+    rounds = min_rounds()
+    # Each extra round doubles the work: stop before the next
+    # round is predicted to go over the budget.
+    while rounds < MAX_ROUNDS:
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds=rounds))
+        if (time.perf_counter() - start) * 2 > budget:
+            break
+        rounds += 1
+    return rounds
+
+
+def get_rounds() -> int:
+    """Return the bcrypt cost used by hash_password,
+       calibrating it on first use.
+    """
+    global _rounds
+    with _rounds_lock:
+        if _rounds is None:
+            pinned = os.getenv("BCRYPT_ROUNDS")
+            _rounds = max(int(pinned), min_rounds()) if pinned \
+                else calibrate_rounds()
+        return _rounds
+
+
+def hash_rounds(hashed_password: bytes) -> int:
+    """Return the cost a bcrypt hash was produced with."""
+    return int(hashed_password.split(b"$")[2])
+
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    """Checks if a hash was produced at a lower cost
+       than the current one. Stronger hashes are kept:
+       a slower or busier machine must not downgrade them.
+    """
+    return hash_rounds(hashed_password) < get_rounds()
+
+
+def verify_and_rehash(hashed_password: bytes, password: str
+                      ) -> Tuple[bool, Optional[bytes]]:
+    """Checks a password and, when it is valid but its hash
+       uses a lower cost, returns a new hash to store.
+    """
+    if not is_valid(hashed_password, password):
+        return False, None
+    if needs_rehash(hashed_password):
+        return True, hash_password(password)
+    return True, None
+
+
+def get_executor() -> Executor:
+    """Return the shared pool of MAX_WORKERS bcrypt threads."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS,
+                                           thread_name_prefix="bcrypt")
+        return _executor
+
+
+async def hash_password_async(password: str) -> bytes:
+    """Hash a password on the bcrypt pool
+       without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), hash_password,
+                                      password)
+
+
+async def is_valid_async(hashed_password: bytes, password: str) -> bool:
+    """Check a password on the bcrypt pool
+       without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), is_valid,
+                                      hashed_password, password)
+
+
+def hash_passwords_batch(passwords: Iterable[str],
+                         workers: Optional[int] = None) -> List[bytes]:
+    """Hash many passwords across all cores,
+       returning the hashes in input order.
+    """
+    return _map(hash_password, passwords, workers)
+
+
+def verify_batch(pairs: Iterable[Tuple[bytes, str]],
+                 workers: Optional[int] = None) -> List[bool]:
+    """Check many (hashed_password, password) pairs
+       across all cores, returning results in input order.
+    """
+    return _map(lambda pair: is_valid(*pair), pairs, workers)
+
+
+def _map(func, items: Iterable, workers: Optional[int]) -> list:
+    """Run func over items on the shared pool, or on a
+       dedicated pool of `workers` threads if given.
+    """
+    if workers is None:
+        return list(get_executor().map(func, items))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, items))
@@ -17,35 +17,220 @@ log message obfuscated:
     filter_datum should be less than 5 lines long and use re.sub
     to perform the substitution with a single regex.
 """
+import argparse
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
 import re
-from typing import List
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import cached_property, lru_cache
+from typing import (Callable, Dict, Iterable, Iterator, List, Mapping,
+                    Optional, Sequence, Tuple)
 import os
 import mysql.connector
 
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+ENGINE_CACHE_SIZE = 128
+TRIE_THRESHOLD = 32
+OVERFLOW_POLICIES = ("block", "drop_oldest", "sample")
+LISTENER_STOP_TIMEOUT = 5.0
+EXPORT_BATCH_SIZE = 1000
+STRUCTURED_OUTPUTS = ("kv", "json")
+_RECORD_ATTRS = frozenset(logging.makeLogRecord({}).__dict__) | \
+    {"message", "asctime"}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class FieldTrie:
+    """ Trie of the reversed field names.
+
+        Every match of `field=` ends right before an '=', so the line is
+        scanned once for '=' and, at each one, the trie is walked
+        backwards. The cost depends on the line and on the longest
+        field name, not on how many fields there are.
+    """
+
+    def __init__(self, fields: Sequence[str]):
+        """Build the trie from the field names."""
+        self.root = {}
+        for field in fields:
+            if not field:
+                continue
+            node = self.root
+            for char in reversed(field):
+                node = node.setdefault(char, {})
+            node[None] = True
+
+    def longest_suffix(self, text: str, end: int, start: int = 0) -> int:
+        """ Return the length of the longest field name equal to the
+            text ending at `end` and starting at or after `start`,
+            or 0 if there is none.
+        """
+        node = self.root
+        best = 0
+        i = end
+        while i > start:
+            node = node.get(text[i - 1])
+            if node is None:
+                break
+            i -= 1
+            if None in node:
+                best = end - i
+        return best
+
+
+class RedactionEngine:
+    """Redacts `field=value` pairs using a pattern compiled once
+       for a given (fields, redaction, separator) combination.
+
+       Up to TRIE_THRESHOLD fields, a regex alternation is used.
+       Above it, a FieldTrie finds the keys in one pass over the
+       line instead.
+    """
+
+    def __init__(self, fields: Tuple[str, ...], redaction: str,
+                 separator: str, matcher: str = "auto"):
+        """Prepare the matcher for the given fields."""
+        if matcher not in ("auto", "regex", "trie"):
+            raise ValueError(f"Unknown matcher: {matcher}")
+        self.fields = tuple(fields)
+        self.redaction = redaction
+        self.separator = separator
+        self.replacement = f'\\1={redaction}'
+        self.bytes_replacement = f'\\1={redaction}'.encode()
+        mask = redaction[:1].encode()
+        self._mask = mask if len(mask) == 1 else b'*'
+        if matcher == "auto":
+            matcher = "trie" if len(self.fields) > TRIE_THRESHOLD \
+                else "regex"
+        self.matcher = matcher
+        if matcher == "trie":
+            self.trie = FieldTrie(self.fields)
+            self._value = re.compile(f'[^{separator}]*')
+
+    @cached_property
+    def regex(self) -> re.Pattern:
+        """The alternation pattern over the fields."""
+        pattern = '|'.join(self.fields)
+        return re.compile(f'({pattern})=[^{self.separator}]*')
+
+    @cached_property
+    def bytes_regex(self) -> re.Pattern:
+        """The alternation pattern, for raw log lines."""
+        pattern = '|'.join(self.fields)
+        return re.compile(f'({pattern})=[^{self.separator}\\n]*'.encode())
+
+    def redact(self, message: str) -> str:
+        """Return the message with the configured fields obfuscated."""
+        if '=' not in message:
+            return message
+        if self.matcher == "trie":
+            return self._redact_trie(message)
+        return self.regex.sub(self.replacement, message)
+
+    def _redact_trie(self, message: str) -> str:
+        """ Same result as the regex, found with the trie: at each '=',
+            the longest field name ending there is redacted.
+        """
+        parts = []
+        start = 0
+        search = 0
+        while True:
+            equals = message.find('=', search)
+            if equals == -1:
+                break
+            if self.trie.longest_suffix(message, equals, start):
+                value_end = self._value.match(message, equals + 1).end()
+                parts.append(message[start:equals + 1])
+                parts.append(self.redaction)
+                start = search = value_end
+            else:
+                search = equals + 1
+        if not parts:
+            return message
+        parts.append(message[start:])
+        return ''.join(parts)
+
+    def redact_bytes(self, data: bytes, preserve_length: bool = False
+                     ) -> bytes:
+        """ Redact a block of raw log lines. Values never extend past
+            the end of their line. With preserve_length, each value is
+            masked with the first character of the redaction, repeated
+            so that the output has the same size as the input.
+        """
+        if not preserve_length:
+            return self.bytes_regex.sub(self.bytes_replacement, data)
+        return self.bytes_regex.sub(self._mask_value, data)
+
+    def _mask_value(self, match: re.Match) -> bytes:
+        """Length-preserving replacement for redact_bytes."""
+        field = match.group(1)
+        return field + b'=' + self._mask * (len(match.group(0)) -
+                                            len(field) - 1)
+
+
+@lru_cache(maxsize=ENGINE_CACHE_SIZE)
+def _cached_engine(fields: Tuple[str, ...], redaction: str,
+                   separator: str) -> RedactionEngine:
+    """Build a RedactionEngine, memoized by its configuration."""
+    return RedactionEngine(fields, redaction, separator)
+
+
+def get_engine(fields: List[str], redaction: str,
+               separator: str) -> RedactionEngine:
+    """Return the cached RedactionEngine for the given configuration."""
+    return _cached_engine(tuple(fields), redaction, separator)
 
 
 def filter_datum(fields: List[str], redaction: str,
                  message: str, separator: str) -> str:
     """ A function that returns the log message obfuscated."""
+    return get_engine(fields, redaction, separator).redact(message)
+
 
-    pattern = '|'.join(fields)
-    return re.sub(f'({pattern})=[^{separator}]*', f'\\1={redaction}', message)
+def get_logger(asynchronous: bool = False, queue_size: int = 10000,
+               overflow: str = "block",
+               structured: Optional[str] = None) -> logging.Logger:
+    """Get a logger object named 'user_data'.
 
+       With asynchronous=True, records are handed to a bounded queue
+       and redacted, formatted and written by a background thread.
+       overflow selects what happens when the queue is full:
+       "block", "drop_oldest" or "sample".
 
-def get_logger() -> logging.Logger:
-    """Get a logger object named 'user_data'."""
+       structured="kv" or "json" masks dict messages and extra= fields
+       by key instead of scanning the formatted line.
+    """
     logger = logging.getLogger("user_data")
     logger.setLevel(logging.INFO)
     logger.propagate = False
 
-    formatter = RedactingFormatter(fields=PII_FIELDS)
+    if structured is not None:
+        formatter = StructuredRedactingFormatter(fields=PII_FIELDS,
+                                                 output=structured)
+    else:
+        formatter = RedactingFormatter(fields=PII_FIELDS)
 
-    stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(formatter)
+    if asynchronous:
+        handler = RedactingQueueHandler(queue_size=queue_size,
+                                        overflow=overflow)
+        handler.setFormatter(formatter)
+        handler.start()
+    else:
+        handler = logging.StreamHandler()
+        handler.setFormatter(formatter)
 
-    logger.addHandler(stream_handler)
+    logger.addHandler(handler)
 
     return logger
 
@@ -75,6 +260,170 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
         raise
 
 
+def get_pool() -> 'ConnectionPool':
+    """ Return the process-wide pool of connections opened by get_db.
+
+        Sized by PERSONAL_DATA_DB_POOL_SIZE (default 5); connections idle
+        for more than PERSONAL_DATA_DB_POOL_IDLE_TIMEOUT seconds (default
+        300) are closed.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                get_db,
+                size=int(os.getenv("PERSONAL_DATA_DB_POOL_SIZE", 5)),
+                idle_timeout=float(
+                    os.getenv("PERSONAL_DATA_DB_POOL_IDLE_TIMEOUT", 300))
+            )
+            atexit.register(_pool.close)
+        return _pool
+
+
+class ConnectionPool:
+    """ A bounded pool of database connections.
+
+        Connections come from the `connect` factory, are health-checked
+        with is_connected() on checkout and are closed once they have
+        been idle for more than idle_timeout seconds. A released
+        connection is rolled back, so that the next borrower does not
+        inherit an open transaction; one that fails to roll back is
+        closed instead.
+    """
+
+    def __init__(self, connect: Callable, size: int = 5,
+                 idle_timeout: float = 300.0,
+                 checkout_timeout: Optional[float] = None):
+        """Initialize an empty pool of at most `size` connections."""
+        if size < 1:
+            raise ValueError("Connection pool size must be at least 1.")
+        self._connect = connect
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def __enter__(self) -> 'ConnectionPool':
+        """Use the pool as a context manager that closes it on exit."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the idle connections."""
+        self.close()
+
+    @contextmanager
+    def connection(self):
+        """ Borrow a connection for the duration of a with block.
+            A connection whose block raised is closed, not reused.
+        """
+        connection = self.acquire()
+        try:
+            yield connection
+        except BaseException:
+            self.release(connection, discard=True)
+            raise
+        self.release(connection)
+
+    def acquire(self):
+        """ Check out a healthy connection, opening one if none is idle.
+            Block while `size` connections are already checked out.
+        """
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise TimeoutError("No database connection available.")
+        try:
+            connection = self._checkout_idle()
+            if connection is None:
+                connection = self._connect()
+            return connection
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection, discard: bool = False):
+        """Return a checked out connection to the pool."""
+        try:
+            if discard or not self._reset(connection):
+                self._close(connection)
+            else:
+                with self._lock:
+                    self._idle.append((connection, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close(connection)
+
+    def idle_count(self) -> int:
+        """Return the number of idle connections."""
+        with self._lock:
+            return len(self._idle)
+
+    def _checkout_idle(self):
+        """ Pop the most recently used healthy idle connection,
+            evicting stale and broken ones along the way.
+        """
+        while True:
+            with self._lock:
+                stale = self._evict_idle()
+                connection = self._idle.pop()[0] if self._idle else None
+            for old in stale:
+                self._close(old)
+            if connection is None or self._is_healthy(connection):
+                return connection
+            self._close(connection)
+
+    def _evict_idle(self) -> list:
+        """ Remove and return the connections idle for too long.
+            The idle list is ordered oldest first. Caller holds the lock.
+        """
+        deadline = time.monotonic() - self.idle_timeout
+        count = 0
+        while count < len(self._idle) and self._idle[count][1] < deadline:
+            count += 1
+        stale = [connection for connection, _ in self._idle[:count]]
+        del self._idle[:count]
+        return stale
+
+    @staticmethod
+    def _is_healthy(connection) -> bool:
+        """Return False if the connection reports it is disconnected."""
+        is_connected = getattr(connection, "is_connected", None)
+        if is_connected is None:
+            return True
+        try:
+            return bool(is_connected())
+        except Exception:
+            return False
+
+    @staticmethod
+    def _reset(connection) -> bool:
+        """ Roll back the transaction a borrower left open, ending its
+            snapshot too. Return False if the connection failed to.
+        """
+        rollback = getattr(connection, "rollback", None)
+        if rollback is None:
+            return True
+        try:
+            rollback()
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def _close(connection):
+        """Close a connection, ignoring errors from broken ones."""
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
 class RedactingFormatter(logging.Formatter):
     """ Redacting Formatter class """
 
@@ -86,43 +435,440 @@ class RedactingFormatter(logging.Formatter):
         """Initialize RedactingFormatter object."""
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.engine = get_engine(fields, self.REDACTION, self.SEPARATOR)
 
     def format(self, record: logging.LogRecord) -> str:
         """ Filter values in incoming log records,
             Fromats the log record as text.
         """
         message = super().format(record)
-        return filter_datum(self.fields, self.REDACTION,
-                            message, self.SEPARATOR)
+        return self.engine.redact(message)
+
+
+class StructuredRedactingFormatter(RedactingFormatter):
+    """ Redacting formatter for records whose message is a mapping
+        or that carry extra= fields. PII keys are masked by key lookup
+        and the fields are serialized in one pass, as key=value pairs
+        or as JSON. Plain free-text records still go through the regex.
+    """
+
+    def __init__(self, fields: List[str], output: str = "kv"):
+        """Initialize StructuredRedactingFormatter object."""
+        if output not in STRUCTURED_OUTPUTS:
+            raise ValueError(f"Unknown structured output: {output}")
+        super().__init__(fields)
+        self.output = output
+        self._field_set = frozenset(fields)
+
+    def format(self, record: logging.LogRecord) -> str:
+        """ Mask and serialize structured records,
+            fall back to the regex path for free text.
+        """
+        if isinstance(record.msg, Mapping) and not record.args:
+            text, data = None, record.msg
+        else:
+            data = {key: value for key, value in record.__dict__.items()
+                    if key not in _RECORD_ATTRS}
+            if not data:
+                return super().format(record)
+            text = self.engine.redact(record.getMessage())
+
+        masked = {key: self.REDACTION if key in self._field_set else value
+                  for key, value in data.items()}
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        exc_text = self.engine.redact(record.exc_text) \
+            if record.exc_text else None
 
+        if self.output == "json":
+            return self._format_json(record, text, masked, exc_text)
 
-def main():
+        pairs = "".join(f"{key}={value}{self.SEPARATOR}"
+                        for key, value in masked.items())
+        record.message = f"{text} {pairs}" if text else pairs
+        if self.usesTime():
+            record.asctime = self.formatTime(record, self.datefmt)
+        line = self.formatMessage(record)
+        return f"{line}\n{exc_text}" if exc_text else line
+
+    def _format_json(self, record: logging.LogRecord, text: Optional[str],
+                     masked: Dict[str, object],
+                     exc_text: Optional[str]) -> str:
+        """Serialize a masked record as a single JSON object."""
+        document = {"logger": record.name,
+                    "level": record.levelname,
+                    "time": self.formatTime(record, self.datefmt)}
+        if text is not None:
+            document["message"] = text
+        document["data"] = masked
+        if exc_text:
+            document["exc_info"] = exc_text
+        return json.dumps(document, default=str)
+
+
+class RedactingQueueHandler(logging.handlers.QueueHandler):
+    """ Hands records to a bounded queue drained by a
+        RedactingQueueListener, so that redaction and stream
+        writes happen off the calling thread.
+    """
+
+    def __init__(self, queue_size: int = 10000, overflow: str = "block",
+                 sample_rate: int = 10, stream=None, batch_size: int = 100):
+        """Initialize the handler and its (not yet started) listener."""
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.overflow = overflow
+        self.sample_rate = sample_rate
+        self.dropped = 0
+        self._overflowed = 0
+        self._overflow_lock = threading.Lock()
+        self.listener = RedactingQueueListener(self, stream, batch_size)
+
+    def start(self):
+        """Start the background listener."""
+        self.listener.start()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """ Merge the message arguments but leave formatting and
+            redaction to the listener thread.
+        """
+        record = logging.makeLogRecord(record.__dict__)
+        if isinstance(record.msg, Mapping) and not record.args:
+            record.msg = dict(record.msg)
+        else:
+            record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        """Put a record on the queue, applying the overflow policy."""
+        if self.overflow == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._handle_overflow(record)
+
+    def _handle_overflow(self, record: logging.LogRecord):
+        """ drop_oldest evicts the oldest queued record for the new one,
+            sample does the same for one overflowing record in
+            sample_rate and drops the others.
+        """
+        with self._overflow_lock:
+            self._overflowed += 1
+            if self.overflow == "sample" and \
+                    self._overflowed % self.sample_rate != 0:
+                self.dropped += 1
+                return
+            try:
+                evicted = self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            else:
+                self.queue.task_done()
+                if evicted is RedactingQueueListener._sentinel:
+                    # never evict the sentinel of a stopping listener:
+                    # put it back and drop the new record instead
+                    try:
+                        self.queue.put(evicted,
+                                       timeout=LISTENER_STOP_TIMEOUT)
+                    except queue.Full:
+                        pass
+                    self.dropped += 1
+                    return
+                self.dropped += 1
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self.dropped += 1
+
+    def flush(self):
+        """Wait until every queued record has been written."""
+        if self.listener.is_alive():
+            self.queue.join()
+
+    def close(self):
+        """Drain the queue and stop the listener."""
+        self.listener.stop()
+        super().close()
+
+
+class RedactingQueueListener:
+    """ Background thread that redacts, formats and writes queued
+        records to a stream in batches.
+    """
+
+    _sentinel = None
+
+    def __init__(self, handler: RedactingQueueHandler, stream=None,
+                 batch_size: int = 100):
+        """Initialize the listener for the given handler."""
+        self.handler = handler
+        self.queue = handler.queue
+        self.stream = stream if stream is not None else sys.stderr
+        self.batch_size = batch_size
+        self._thread = None
+
+    def is_alive(self) -> bool:
+        """Return True while the listener thread is running."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the listener thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._monitor,
+                                        name="user_data-log-listener",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = LISTENER_STOP_TIMEOUT):
+        """ Write everything still queued, then stop the thread.
+            Give up after timeout seconds if the queue cannot take
+            the sentinel or the thread does not finish, so that
+            logging.shutdown never hangs the interpreter exit.
+        """
+        if self._thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            self.queue.put(self._sentinel, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+        if not self._thread.is_alive():
+            self._thread = None
+
+    def _monitor(self):
+        """Drain the queue in batches until the sentinel is seen."""
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if self._write(batch):
+                return
+
+    def _write(self, batch: List[logging.LogRecord]) -> bool:
+        """ Format a batch and write it with a single call.
+            Return True if the batch contained the sentinel.
+        """
+        stop = False
+        lines = []
+        for record in batch:
+            if record is self._sentinel:
+                stop = True
+                continue
+            try:
+                lines.append(self.handler.format(record))
+            except Exception:
+                self.handler.handleError(record)
+        if lines:
+            try:
+                self.stream.write("\n".join(lines) + "\n")
+                self.stream.flush()
+            except Exception:
+                self.handler.handleError(batch[-1])
+        for _ in batch:
+            self.queue.task_done()
+        return stop
+
+
+def iter_rows(cursor, batch_size: int = EXPORT_BATCH_SIZE
+              ) -> Iterator[tuple]:
+    """Yield the rows of an executed cursor, fetchmany batch by batch."""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def redact_rows(column_names: Sequence[str], rows: Iterable[tuple],
+                fields: Sequence[str] = PII_FIELDS,
+                redaction: str = RedactingFormatter.REDACTION
+                ) -> Iterator[Dict[str, object]]:
+    """ Yield each row as a dict with the PII columns redacted.
+        The column mask is computed once, not per row.
+    """
+    columns = tuple(column_names)
+    mask = tuple(column in fields for column in columns)
+    for row in rows:
+        yield {column: redaction if masked else value
+               for column, masked, value in zip(columns, mask, row)}
+
+
+def stream_users(cursor, batch_size: int = EXPORT_BATCH_SIZE,
+                 query: str = "SELECT * FROM users", params: tuple = ()
+                 ) -> Iterator[Dict[str, object]]:
+    """ Stream the redacted rows of the users table.
+        Works with any DB-API cursor: memory use is bounded by
+        batch_size, not by the size of the table.
+    """
+    cursor.execute(query, params)
+    column_names = [column[0] for column in cursor.description]
+    yield from redact_rows(column_names, iter_rows(cursor, batch_size))
+
+
+def _check_identifier(name: str) -> str:
+    """Make sure a column name is safe to interpolate into SQL."""
+    if not re.fullmatch(r'\w+', name):
+        raise ValueError(f"Invalid column name: {name}")
+    return name
+
+
+def partition_bounds(cursor, key: str, partitions: int
+                     ) -> List[Tuple[object, object]]:
+    """ Split the users table into keyset ranges on `key`.
+        Return a list of (lower, upper) pairs, lower inclusive and
+        upper exclusive, where None means unbounded.
+    """
+    key = _check_identifier(key)
+    cursor.execute("SELECT COUNT(*) FROM users")
+    total = cursor.fetchone()[0]
+    bounds = []
+    for i in range(1, partitions):
+        cursor.execute(f"SELECT {key} FROM users ORDER BY {key} "
+                       f"LIMIT 1 OFFSET {i * total // partitions}")
+        row = cursor.fetchone()
+        if row is not None and (not bounds or row[0] != bounds[-1]):
+            bounds.append(row[0])
+    edges = [None] + bounds + [None]
+    return list(zip(edges, edges[1:]))
+
+
+def _partition_query(key: str, lower: object, upper: object,
+                     placeholder: str) -> Tuple[str, tuple]:
+    """Build the SELECT for one keyset range, ordered by key."""
+    conditions = []
+    params = []
+    if lower is not None:
+        conditions.append(f"{key} >= {placeholder}")
+        params.append(lower)
+    if upper is not None:
+        conditions.append(f"{key} < {placeholder}")
+        params.append(upper)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    return f"SELECT * FROM users{where} ORDER BY {key}", tuple(params)
+
+
+def export_partition(connect: Callable, key: str, lower: object,
+                     upper: object, path: str,
+                     batch_size: int = EXPORT_BATCH_SIZE,
+                     placeholder: str = "%s") -> int:
+    """ Redact one keyset range of the users table into `path`, one
+        log line per row, formatted as get_logger() would.
+        Runs in a worker process. Return the number of rows written.
+    """
+    formatter = RedactingFormatter(fields=PII_FIELDS)
+    query, params = _partition_query(_check_identifier(key), lower, upper,
+                                     placeholder)
+    count = 0
+    connection = connect()
+    try:
+        cursor = connection.cursor()
+        with open(path, "w") as output:
+            for filtered_user in stream_users(cursor, batch_size,
+                                              query, params):
+                record = logging.LogRecord("user_data", logging.INFO,
+                                           __file__, 0,
+                                           "Filtered user data: %s",
+                                           (filtered_user,), None)
+                output.write(formatter.format(record) + "\n")
+                count += 1
+        cursor.close()
+    finally:
+        connection.close()
+    return count
+
+
+def parallel_export(connect: Callable, workers: int, key: str = "id",
+                    output=None, output_dir: Optional[str] = None,
+                    batch_size: int = EXPORT_BATCH_SIZE,
+                    placeholder: str = "%s") -> int:
+    """ Export the redacted users table with a pool of worker processes,
+        one keyset range each.
+
+        `connect` must be picklable and return a new DB-API connection.
+        With output_dir, one file per shard is kept there; otherwise the
+        shards are merged, in key order, into `output` (default stderr).
+        Return the total number of rows exported.
+    """
+    connection = connect()
+    try:
+        cursor = connection.cursor()
+        ranges = partition_bounds(cursor, key, workers)
+        cursor.close()
+    finally:
+        connection.close()
+
+    shard_dir = output_dir or tempfile.mkdtemp(prefix="users_export_")
+    os.makedirs(shard_dir, exist_ok=True)
+    paths = [os.path.join(shard_dir, f"users.{i:04d}.log")
+             for i in range(len(ranges))]
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(export_partition, connect, key,
+                                       lower, upper, path, batch_size,
+                                       placeholder)
+                       for (lower, upper), path in zip(ranges, paths)]
+            total = sum(future.result() for future in futures)
+
+        if output_dir is None:
+            output = output if output is not None else sys.stderr
+            for path in paths:
+                with open(path) as shard:
+                    shutil.copyfileobj(shard, output)
+            output.flush()
+    finally:
+        if output_dir is None:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+    return total
+
+
+def main(argv: Optional[List[str]] = None):
     """Retrieve user data from database"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="export in parallel with N processes")
+    parser.add_argument("--key", default="id",
+                        help="primary key used to partition the table")
+    parser.add_argument("--output-dir",
+                        help="write one file per shard instead of merging")
+    args = parser.parse_args(argv)
 
     # Configure logger
     logger = get_logger()
+    batch_size = int(os.getenv("PERSONAL_DATA_EXPORT_BATCH_SIZE",
+                               EXPORT_BATCH_SIZE))
 
-    # Connect to the database
-    try:
-        db_connection = get_db()
-        cursor = db_connection.cursor()
+    if args.workers > 1:
+        try:
+            parallel_export(get_db, args.workers, key=args.key,
+                            output_dir=args.output_dir,
+                            batch_size=batch_size)
+        except mysql.connector.Error as err:
+            logger.error("Error connecting to database: %s", err)
+        return
 
-        # Fetch all rows from the users table
-        cursor.execute("SELECT * FROM users")
-        users = cursor.fetchall()
-
-        # Log each user data with redacted PII fields
-        for user in users:
-            filtered_user = {key: "***" if key in PII_FIELDS else value
-                             for key, value in zip(cursor.column_names, user)}
-            logger.info("Filtered user data: %s", filtered_user)
+    # Borrow a connection from the pool
+    try:
+        with get_pool().connection() as db_connection:
+            cursor = db_connection.cursor(buffered=False)
+            try:
+                # Stream the users table and log each row with
+                # redacted PII fields
+                for filtered_user in stream_users(cursor, batch_size):
+                    logger.info("Filtered user data: %s", filtered_user)
+            finally:
+                cursor.close()
 
     except mysql.connector.Error as err:
         logger.error("Error connecting to database: %s", err)
-    finally:
-        if 'db_connection' in locals() and db_connection.is_connected():
-            cursor.close()
-            db_connection.close()
 
 
 if __name__ == '__main__':
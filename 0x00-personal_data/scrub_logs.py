@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Offline scrubber for log files written before RedactingFormatter
+was deployed.
+
+Applies the filter_datum redaction (same fields, separator and
+redaction string) to existing files. The input is memory-mapped and
+processed in chunks that end on line boundaries, so memory use does
+not grow with the file size. Chunks can be redacted in parallel.
+
+Rewriting a file in place keeps its size, so each value is masked
+with as many characters as it had: the scrubbed file still tells the
+length of every password, SSN or phone number. It is only done when
+asked for explicitly with --allow-length-leak.
+
+    Usage: ./scrub_logs.py access.log -o access.scrubbed.log
+           ./scrub_logs.py access.log --in-place --allow-length-leak
+"""
+import argparse
+import mmap
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from filtered_logger import PII_FIELDS, RedactingFormatter, get_engine
+
+CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def chunk_ranges(data: mmap.mmap, chunk_size: int = CHUNK_SIZE
+                 ) -> Iterator[Tuple[int, int]]:
+    """Yield (start, end) offsets of chunks ending on a line boundary."""
+    size = len(data)
+    start = 0
+    while start < size:
+        end = min(start + chunk_size, size)
+        if end < size:
+            newline = data.find(b'\n', end - 1)
+            end = size if newline == -1 else newline + 1
+        yield start, end
+        start = end
+
+
+def scrub_range(path: str, start: int, end: int, fields: Sequence[str],
+                redaction: str, separator: str,
+                in_place: bool = False) -> Optional[bytes]:
+    """ Redact bytes [start, end) of a file.
+        Return the redacted bytes, or write them back over the
+        original range when in_place is set (masking is then
+        length-preserving) and return None.
+    """
+    engine = get_engine(fields, redaction, separator)
+    with open(path, "r+b" if in_place else "rb") as f:
+        access = mmap.ACCESS_WRITE if in_place else mmap.ACCESS_READ
+        with mmap.mmap(f.fileno(), 0, access=access) as data:
+            redacted = engine.redact_bytes(data[start:end],
+                                           preserve_length=in_place)
+            if not in_place:
+                return redacted
+            data[start:end] = redacted
+            data.flush(start - start % mmap.ALLOCATIONGRANULARITY,
+                       end - start + start % mmap.ALLOCATIONGRANULARITY)
+    return None
+
+
+def scrub_file(source: str, destination: Optional[str] = None,
+               fields: Sequence[str] = PII_FIELDS,
+               redaction: str = RedactingFormatter.REDACTION,
+               separator: str = RedactingFormatter.SEPARATOR,
+               chunk_size: int = CHUNK_SIZE, workers: int = 1,
+               allow_length_leak: bool = False) -> int:
+    """ Scrub `source` into `destination`, or in place when no
+        destination is given. Return the number of bytes processed.
+        In place, masks keep the length of the values: this raises
+        ValueError unless allow_length_leak is set. A destination that
+        is the source file raises ValueError too, as opening it for
+        writing would truncate the log before it is read.
+    """
+    in_place = destination is None
+    if in_place and not allow_length_leak:
+        raise ValueError("scrubbing in place leaks the length of each "
+                         "value; pass allow_length_leak=True to accept it")
+    if not in_place and os.path.exists(destination) and \
+            os.path.samefile(source, destination):
+        raise ValueError("the output is the source file; scrub it in "
+                         "place instead")
+    fields = tuple(fields)
+    size = os.path.getsize(source)
+    if size == 0:
+        if not in_place:
+            open(destination, "wb").close()
+        return 0
+
+    with open(source, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            ranges = list(chunk_ranges(data, chunk_size))
+
+    args = (fields, redaction, separator, in_place)
+    output = None if in_place else open(destination, "wb")
+    try:
+        if workers <= 1:
+            for start, end in ranges:
+                _write(output, scrub_range(source, start, end, *args))
+            return size
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Keep a bounded window of chunks in flight so that results
+            # waiting to be written do not pile up in memory.
+            window = workers * 2
+            pending: List = []
+            for start, end in ranges:
+                pending.append(executor.submit(scrub_range, source,
+                                               start, end, *args))
+                if len(pending) >= window:
+                    _write(output, pending.pop(0).result())
+            for future in pending:
+                _write(output, future.result())
+        return size
+    finally:
+        if output is not None:
+            output.close()
+
+
+def _write(output, chunk: Optional[bytes]):
+    """Append a redacted chunk to the output file, if there is one."""
+    if output is not None:
+        output.write(chunk)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Scrub PII from existing log files."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("source", help="log file to scrub")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("-o", "--output", help="write the result here")
+    target.add_argument("--in-place", action="store_true",
+                        help="overwrite the file, masking values with "
+                             "the same number of characters (requires "
+                             "--allow-length-leak)")
+    parser.add_argument("--allow-length-leak", action="store_true",
+                        help="accept that --in-place leaves the length "
+                             "of every masked value readable")
+    parser.add_argument("--fields", nargs="+", default=list(PII_FIELDS))
+    parser.add_argument("--redaction", default=RedactingFormatter.REDACTION)
+    parser.add_argument("--separator", default=RedactingFormatter.SEPARATOR)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args(argv)
+    if args.in_place and not args.allow_length_leak:
+        parser.error("--in-place leaks the length of every masked value; "
+                     "add --allow-length-leak to accept it, or use -o")
+
+    try:
+        scrub_file(args.source, args.output, args.fields, args.redaction,
+                   args.separator, args.chunk_size, args.workers,
+                   args.allow_length_leak)
+    except ValueError as err:
+        parser.error(str(err))
+    except OSError as err:
+        print(f"Error scrubbing {args.source}: {err}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
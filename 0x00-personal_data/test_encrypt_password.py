@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+""" Tests of encrypt_password
+"""
+import bcrypt
+import encrypt_password
+
+
+def test_min_rounds_defaults_to_bcrypt_default(monkeypatch):
+    """ Without BCRYPT_MIN_ROUNDS, the floor is bcrypt's default cost
+    """
+    monkeypatch.delenv("BCRYPT_MIN_ROUNDS", raising=False)
+    assert encrypt_password.min_rounds() == 12
+
+
+def test_calibration_never_goes_below_the_floor(monkeypatch):
+    """ A tiny budget still calibrates to the minimum cost
+    """
+    monkeypatch.setenv("BCRYPT_MIN_ROUNDS", "5")
+    assert encrypt_password.calibrate_rounds(budget=0.0) == 5
+
+
+def test_pinned_rounds_are_clamped(monkeypatch):
+    """ BCRYPT_ROUNDS below the floor is raised to it
+    """
+    monkeypatch.setenv("BCRYPT_MIN_ROUNDS", "6")
+    monkeypatch.setenv("BCRYPT_ROUNDS", "4")
+    monkeypatch.setattr(encrypt_password, "_rounds", None)
+    assert encrypt_password.get_rounds() == 6
+
+
+def test_only_weaker_hashes_need_a_rehash(monkeypatch):
+    """ A hash stronger than the current cost is kept
+    """
+    monkeypatch.setattr(encrypt_password, "_rounds", 5)
+    weaker = bcrypt.hashpw(b"pwd", bcrypt.gensalt(rounds=4))
+    same = bcrypt.hashpw(b"pwd", bcrypt.gensalt(rounds=5))
+    stronger = bcrypt.hashpw(b"pwd", bcrypt.gensalt(rounds=6))
+    assert encrypt_password.needs_rehash(weaker)
+    assert not encrypt_password.needs_rehash(same)
+    assert not encrypt_password.needs_rehash(stronger)
+    assert encrypt_password.verify_and_rehash(stronger, "pwd") == (True, None)
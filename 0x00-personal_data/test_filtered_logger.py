@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+""" Tests of filtered_logger
+"""
+import io
+import logging
+import sqlite3
+import threading
+import time
+import pytest
+import filtered_logger
+
+
+class CountingCursor:
+    """ sqlite3 cursor recording the size of each fetchmany() call
+    """
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        """ Wrap a cursor
+        """
+        self.cursor = cursor
+        self.fetches = []
+
+    def execute(self, query: str, params: tuple = ()):
+        """ Execute a query
+        """
+        return self.cursor.execute(query, params)
+
+    @property
+    def description(self):
+        """ Columns of the last query
+        """
+        return self.cursor.description
+
+    def fetchmany(self, size: int) -> list:
+        """ Fetch up to size rows, recording the call
+        """
+        rows = self.cursor.fetchmany(size)
+        self.fetches.append(len(rows))
+        return rows
+
+    def fetchall(self):
+        """ Must not be used by a streaming export
+        """
+        raise AssertionError("fetchall() loads the whole table")
+
+
+def users_cursor(count: int) -> CountingCursor:
+    """ Return a cursor on an in-memory users table of count rows
+    """
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE users (name TEXT, email TEXT, "
+                       "phone TEXT, ssn TEXT, password TEXT, ip TEXT, "
+                       "last_login TEXT, user_agent TEXT)")
+    connection.executemany(
+        "INSERT INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (("user{}".format(i), "user{}@hbtn.io".format(i), "555-0100",
+          "123-45-6789", "secret", "10.0.0.{}".format(i % 256),
+          "2019-11-14 06:14:24", "Mozilla") for i in range(count)))
+    return CountingCursor(connection.cursor())
+
+
+def test_stream_users_masks_pii_columns():
+    """ PII columns are redacted, the others kept as they are
+    """
+    rows = list(filtered_logger.stream_users(users_cursor(3)))
+    assert len(rows) == 3
+    for i, row in enumerate(rows):
+        for field in filtered_logger.PII_FIELDS:
+            assert row[field] == filtered_logger.RedactingFormatter.REDACTION
+        assert row["ip"] == "10.0.0.{}".format(i)
+        assert row["last_login"] == "2019-11-14 06:14:24"
+        assert row["user_agent"] == "Mozilla"
+
+
+def test_stream_users_reads_in_batches():
+    """ Rows are read batch_size at a time, lazily
+    """
+    cursor = users_cursor(25)
+    rows = filtered_logger.stream_users(cursor, batch_size=10)
+    next(rows)
+    assert cursor.fetches == [10]
+    assert len(list(rows)) == 24
+    assert cursor.fetches == [10, 10, 5, 0]
+
+
+class SlowStream(io.StringIO):
+    """ Stream slower to write than the producers log
+    """
+
+    def write(self, text: str) -> int:
+        """ Write after a delay
+        """
+        time.sleep(0.02)
+        return super().write(text)
+
+
+def test_close_under_drop_oldest_does_not_hang():
+    """ The overflow policy must never evict the stop sentinel
+    """
+    handler = filtered_logger.RedactingQueueHandler(
+        queue_size=4, overflow="drop_oldest", stream=SlowStream(),
+        batch_size=1)
+    handler.setFormatter(
+        filtered_logger.RedactingFormatter(fields=filtered_logger.PII_FIELDS))
+    handler.start()
+    logger = logging.getLogger("test_close_under_drop_oldest")
+    logger.propagate = False
+    logger.addHandler(handler)
+    stop = threading.Event()
+
+    def produce():
+        while not stop.is_set():
+            logger.warning("name=bob;")
+
+    producers = [threading.Thread(target=produce) for _ in range(4)]
+    for producer in producers:
+        producer.start()
+    time.sleep(0.05)
+    start = time.monotonic()
+    handler.close()
+    elapsed = time.monotonic() - start
+    stop.set()
+    for producer in producers:
+        producer.join()
+    logger.removeHandler(handler)
+    assert not handler.listener.is_alive()
+    assert elapsed < filtered_logger.LISTENER_STOP_TIMEOUT
+
+
+class FakeConnection:
+    """ Connection of a fake connector, recording its calls
+    """
+
+    def __init__(self):
+        """ Open a connection
+        """
+        self.connected = True
+        self.closed = False
+        self.rollbacks = 0
+        self.rollback_fails = False
+
+    def is_connected(self) -> bool:
+        """ Report the health of the connection
+        """
+        return self.connected
+
+    def rollback(self):
+        """ Roll back the current transaction
+        """
+        if self.rollback_fails:
+            raise ConnectionError("lost connection")
+        self.rollbacks += 1
+
+    def close(self):
+        """ Close the connection
+        """
+        self.closed = True
+
+
+class FakeConnector:
+    """ Factory of fake connections, keeping every one it opened
+    """
+
+    def __init__(self):
+        """ Initialize a connector that opened nothing
+        """
+        self.opened = []
+
+    def __call__(self) -> FakeConnection:
+        """ Open a connection
+        """
+        self.opened.append(FakeConnection())
+        return self.opened[-1]
+
+
+def test_pool_rolls_back_released_connections():
+    """ A released connection is rolled back before reuse, or closed if
+        it cannot be
+    """
+    connect = FakeConnector()
+    pool = filtered_logger.ConnectionPool(connect, size=1)
+    with pool.connection() as connection:
+        pass
+    assert connection.rollbacks == 1 and not connection.closed
+    with pool.connection() as again:
+        assert again is connection
+        again.rollback_fails = True
+    assert connection.closed and pool.idle_count() == 0
+    with pool.connection() as fresh:
+        assert fresh is not connection
+    assert len(connect.opened) == 2
+
+
+def test_pool_checks_health_on_checkout():
+    """ An idle connection that reports it is disconnected is closed
+        and replaced
+    """
+    connect = FakeConnector()
+    pool = filtered_logger.ConnectionPool(connect, size=2)
+    connection = pool.acquire()
+    pool.release(connection)
+    connection.connected = False
+    fresh = pool.acquire()
+    assert fresh is not connection and connection.closed
+    pool.release(fresh)
+    assert pool.acquire() is fresh
+
+
+def test_pool_evicts_idle_connections():
+    """ Connections idle for longer than idle_timeout are closed
+    """
+    connect = FakeConnector()
+    pool = filtered_logger.ConnectionPool(connect, size=2, idle_timeout=0.05)
+    connection = pool.acquire()
+    pool.release(connection)
+    time.sleep(0.1)
+    fresh = pool.acquire()
+    assert fresh is not connection and connection.closed
+    assert pool.idle_count() == 0
+
+
+def test_pool_bounds_checkouts():
+    """ No more than size connections are out at once: a checkout waits
+        for a release, up to checkout_timeout
+    """
+    connect = FakeConnector()
+    pool = filtered_logger.ConnectionPool(connect, size=2,
+                                          checkout_timeout=0.05)
+    first, second = pool.acquire(), pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+    # released meanwhile, well within the timeout
+    pool.checkout_timeout = 5.0
+    threading.Timer(0.02, pool.release, (first,)).start()
+    assert pool.acquire() is first
+    assert len(connect.opened) == 2
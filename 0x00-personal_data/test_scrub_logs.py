@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+""" Tests of scrub_logs
+"""
+import pytest
+import scrub_logs
+
+LINE = b"name=bob;email=bob@hbtn.io;ip=10.0.0.1;password=hunter2;\n"
+
+
+def test_in_place_requires_allowing_the_length_leak(tmp_path):
+    """ In place is refused unless the length leak is accepted
+    """
+    log = tmp_path / "access.log"
+    log.write_bytes(LINE)
+    with pytest.raises(ValueError):
+        scrub_logs.scrub_file(str(log))
+    with pytest.raises(SystemExit):
+        scrub_logs.main([str(log), "--in-place"])
+    assert log.read_bytes() == LINE
+
+    scrub_logs.main([str(log), "--in-place", "--allow-length-leak"])
+    scrubbed = log.read_bytes()
+    assert len(scrubbed) == len(LINE)
+    assert b"hunter2" not in scrubbed and b"10.0.0.1" in scrubbed
+
+
+def test_output_masks_with_the_redaction(tmp_path):
+    """ Written to another file, values become the redaction string
+    """
+    log = tmp_path / "access.log"
+    log.write_bytes(LINE * 3)
+    output = tmp_path / "scrubbed.log"
+    scrub_logs.main([str(log), "-o", str(output)])
+    assert output.read_bytes() == \
+        b"name=***;email=***;ip=10.0.0.1;password=***;\n" * 3
+
+
+def test_output_cannot_be_the_source(tmp_path):
+    """ -o naming the log itself, or a link to it, is refused before
+        the log is truncated
+    """
+    log = tmp_path / "access.log"
+    log.write_bytes(LINE)
+    link = tmp_path / "link.log"
+    link.symlink_to(log)
+    for output in (log, link):
+        with pytest.raises(ValueError):
+            scrub_logs.scrub_file(str(log), str(output))
+        with pytest.raises(SystemExit):
+            scrub_logs.main([str(log), "-o", str(output)])
+    assert log.read_bytes() == LINE
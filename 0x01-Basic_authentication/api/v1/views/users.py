@@ -2,18 +2,164 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from datetime import datetime
+from flask import Response, abort, jsonify, request
+from models.base import TIMESTAMP_FORMAT
+from models.query import Prefix, Range, Suffix
 from models.user import User
+from urllib.parse import urlencode
+
+
+# Users read from the store at a time while streaming the full list
+STREAM_BATCH_SIZE = 1000
+# Users returned by GET /api/v1/users/search without a limit
+SEARCH_LIMIT = 100
+# Query parameters of GET /api/v1/users bounding a time: attribute, bound
+TIME_BOUNDS = {'created_after': ('created_at', 'low'),
+               'created_before': ('created_at', 'high'),
+               'updated_after': ('updated_at', 'low'),
+               'updated_before': ('updated_at', 'high')}
+
+
+def user_response(user: User, status: int = 200) -> Response:
+    """ Response with the cached JSON bytes of a User
+    """
+    return Response(user.to_json_bytes(), status,
+                    mimetype='application/json')
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters:
+      - limit (optional): page size, the list is streamed without it
+      - after (optional): ID of the last User of the previous page
+      - created_after, created_before, updated_after, updated_before
+        (optional): time bounds, excluded, as %Y-%m-%dT%H:%M:%S
+      - email_prefix or email_suffix (optional): start or end of email
+      - order_by (optional): email, created_at or updated_at, after a
+        "-" for the descending order; pages then have no `after`
     Return:
-      - list of all User objects JSON represented
+      - list of User objects JSON represented, in ID order by default
+      - Link header to the next page when the page is full
+      - 400 if a query parameter is invalid
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    after = request.args.get('after')
+    limit = request.args.get('limit')
+    order_by = request.args.get('order_by')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit <= 0:
+            return jsonify({'error': "limit must be a positive integer"}), 400
+    try:
+        attributes = user_conditions()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if order_by is not None:
+        if order_by.lstrip('-') not in User.SORTED_ATTRIBUTES:
+            return jsonify({'error': "order_by must be one of {}".format(
+                ", ".join(User.SORTED_ATTRIBUTES))}), 400
+        if after is not None:
+            return jsonify({'error': "after only pages the ID order"}), 400
+
+    if not attributes and order_by is None:
+        if limit is None:
+            return Response(stream_users(after),
+                            mimetype='application/json')
+        users = User.page(after, limit)
+    else:
+        if after is not None:
+            attributes['id'] = Range(low=after, include_low=False)
+        users = User.search(attributes,
+                            order_by=order_by.lstrip('-') if order_by
+                            else 'id',
+                            reverse=order_by is not None and
+                            order_by.startswith('-'),
+                            limit=limit)
+    response = Response(b'[' + b','.join(user.to_json_bytes()
+                                         for user in users) + b']',
+                        mimetype='application/json')
+    if order_by is None and limit is not None and len(users) == limit:
+        args = request.args.to_dict()
+        args['after'] = users[-1].id
+        response.headers['Link'] = '<{}?{}>; rel="next"'.format(
+            request.base_url, urlencode(args))
+    return response
+
+
+def user_conditions() -> dict:
+    """ Return the User.search() conditions of the query parameters
+        Raise ValueError with a message for an invalid one
+    """
+    attributes = {}
+    for name, (attribute, bound) in TIME_BOUNDS.items():
+        value = request.args.get(name)
+        if value is None:
+            continue
+        try:
+            moment = datetime.strptime(value, TIMESTAMP_FORMAT)
+        except ValueError:
+            raise ValueError("{} must be formatted as {}".format(
+                name, TIMESTAMP_FORMAT))
+        condition = attributes.setdefault(
+            attribute, Range(include_low=False, include_high=False))
+        setattr(condition, bound, moment)
+    prefix = request.args.get('email_prefix')
+    suffix = request.args.get('email_suffix')
+    if prefix is not None and suffix is not None:
+        raise ValueError("email_prefix and email_suffix exclude each other")
+    if prefix is not None:
+        attributes['email'] = Prefix(prefix)
+    if suffix is not None:
+        attributes['email'] = Suffix(suffix)
+    return attributes
+
+
+def stream_users(after: str = None):
+    """ Yield the JSON array of the Users after the ID `after`, reading
+        them from the store by batches
+    """
+    yield b'['
+    separator = b''
+    while True:
+        users = User.page(after, STREAM_BATCH_SIZE)
+        for user in users:
+            yield separator + user.to_json_bytes()
+            separator = b','
+        if len(users) < STREAM_BATCH_SIZE:
+            break
+        after = users[-1].id
+    yield b']'
+
+
+@app_views.route('/users/search', methods=['GET'], strict_slashes=False)
+def search_users() -> str:
+    """ GET /api/v1/users/search
+    Query parameters:
+      - q: text to find in the email, first name or last name,
+        ignoring case
+      - limit (optional): maximum number of Users, SEARCH_LIMIT by default
+    Return:
+      - list of matching User objects JSON represented, email matches
+        first
+      - 400 if q is missing or limit is invalid
+    """
+    q = request.args.get('q')
+    if not q:
+        return jsonify({'error': "q missing"}), 400
+    try:
+        limit = int(request.args.get('limit', SEARCH_LIMIT))
+    except ValueError:
+        limit = 0
+    if limit <= 0:
+        return jsonify({'error': "limit must be a positive integer"}), 400
+    users = User.search_text(q, limit)
+    return Response(b'[' + b','.join(user.to_json_bytes()
+                                     for user in users) + b']',
+                    mimetype='application/json')
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -30,7 +176,7 @@ def view_one_user(user_id: str = None) -> str:
     user = User.get(user_id)
     if user is None:
         abort(404)
-    return jsonify(user.to_json())
+    return user_response(user)
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
@@ -83,12 +229,53 @@ def create_user() -> str:
             user.first_name = rj.get("first_name")
             user.last_name = rj.get("last_name")
             user.save()
-            return jsonify(user.to_json()), 201
+            return user_response(user, 201)
         except Exception as e:
             error_msg = "Can't create User: {}".format(e)
     return jsonify({'error': error_msg}), 400
 
 
+@app_views.route('/users/batch', methods=['POST'], strict_slashes=False)
+def create_users_batch() -> str:
+    """ POST /api/v1/users/batch
+    JSON body:
+      - list of users, each with:
+        - email
+        - password
+        - last_name (optional)
+        - first_name (optional)
+    Return:
+      - list of User objects JSON represented
+      - 400 if one of the Users can't be created (none is created)
+    """
+    rj = None
+    try:
+        rj = request.get_json()
+    except Exception as e:
+        rj = None
+    if not isinstance(rj, list):
+        return jsonify({'error': "Wrong format"}), 400
+    items = []
+    for i, u in enumerate(rj):
+        if not isinstance(u, dict):
+            return jsonify({'error': "Wrong format at {}".format(i)}), 400
+        if u.get("email", "") == "":
+            return jsonify({'error': "email missing at {}".format(i)}), 400
+        if u.get("password", "") == "":
+            return jsonify({'error': "password missing at {}".format(i)}), 400
+        items.append({"email": u.get("email"),
+                      "password": u.get("password"),
+                      "first_name": u.get("first_name"),
+                      "last_name": u.get("last_name")})
+    try:
+        users = User.bulk_create(items)
+    except Exception as e:
+        return jsonify({'error': "Can't create Users: {}".format(e)}), 400
+    return Response(b'[' + b','.join(user.to_json_bytes()
+                                     for user in users) + b']', 201,
+                    mimetype='application/json')
+
+
 @app_views.route('/users/<user_id>', methods=['PUT'], strict_slashes=False)
 def update_user(user_id: str = None) -> str:
     """ PUT /api/v1/users/:id
@@ -119,4 +306,4 @@ def update_user(user_id: str = None) -> str:
     if rj.get('last_name') is not None:
         user.last_name = rj.get('last_name')
     user.save()
-    return jsonify(user.to_json()), 200
+    return user_response(user)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+""" File lock module
+"""
+import fcntl
+import os
+import threading
+from contextlib import contextmanager
+
+
+class FileLock():
+    """ Advisory lock on a file shared by processes, reentrant within
+        a process
+
+        Threads of a process take turns; the process holds the flock
+        while any of them is inside. A shared hold may be nested in an
+        exclusive one, not the other way around: flock() would release
+        the shared lock before taking the exclusive one, letting another
+        process write in between.
+    """
+
+    def __init__(self, file_path: str):
+        """ Initialize a lock on file_path, created on first use
+        """
+        self.file_path = file_path
+        self.lock = threading.RLock()
+        self.fd = None
+        self.pid = None
+        self.depth = 0
+        self.exclusive = False
+
+    @contextmanager
+    def hold(self, exclusive: bool = False):
+        """ Hold the lock, shared or exclusive, for a with block
+        """
+        with self.lock:
+            if self.pid != os.getpid():
+                # a forked child must not share the parent's lock
+                self.fd = os.open(self.file_path, os.O_RDWR | os.O_CREAT,
+                                  0o644)
+                self.pid = os.getpid()
+                self.depth = 0
+                self.exclusive = False
+            if self.depth > 0 and exclusive and not self.exclusive:
+                raise RuntimeError("an exclusive hold cannot be nested in "
+                                   "a shared one of {}".format(
+                                       self.file_path))
+            if self.depth == 0:
+                fcntl.flock(self.fd,
+                            fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                self.exclusive = exclusive
+            self.depth += 1
+            try:
+                yield
+            finally:
+                self.depth -= 1
+                if self.depth == 0:
+                    fcntl.flock(self.fd, fcntl.LOCK_UN)
+                    self.exclusive = False
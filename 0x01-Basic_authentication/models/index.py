@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+""" Index module
+"""
+import threading
+from array import array
+from bisect import bisect_left
+from itertools import chain
+from typing import Callable, Iterator, List, Optional, Set, TypeVar
+from models.query import Condition, Contains, Prefix, Range, Suffix, sort_key
+
+
+# Merge buffered additions one by one below this count, else re-sort
+MERGE_INSORT_MAX = 64
+# Renumber a trigram index once this share of its numbers is discarded
+TRIGRAM_COMPACT_RATIO = 0.5
+
+
+class HashIndex():
+    """ Maps the values of one attribute to the stored objects
+        holding them, for constant time equality lookups
+
+        An entry may hold None instead of an object that is not loaded
+        yet; lookups then materialize it with `loader(id)`.
+    """
+
+    def __init__(self, attribute: str, loader: Callable = None):
+        """ Initialize an empty index on `attribute`
+        """
+        self.attribute = attribute
+        self.loader = loader
+        self.buckets = {}
+        self.unhashable = {}
+
+    def add(self, obj: TypeVar('Base')):
+        """ Index an object under its current value
+        """
+        value = getattr(obj, self.attribute, None)
+        try:
+            self.buckets.setdefault(value, {})[obj.id] = obj
+        except TypeError:
+            self.unhashable[obj.id] = obj
+
+    def add_id(self, obj_id: str, value):
+        """ Index an object that is not loaded yet under value
+        """
+        try:
+            self.buckets.setdefault(value, {})[obj_id] = None
+        except TypeError:
+            pass
+
+    def discard(self, obj: TypeVar('Base')):
+        """ Remove an object, indexed under its current value
+        """
+        value = getattr(obj, self.attribute, None)
+        try:
+            bucket = self.buckets.get(value)
+        except TypeError:
+            self.unhashable.pop(obj.id, None)
+            return
+        if bucket is not None:
+            bucket.pop(obj.id, None)
+            if not bucket:
+                del self.buckets[value]
+
+    def lookup(self, value) -> Optional[List[TypeVar('Base')]]:
+        """ Return the objects whose attribute equals value,
+            or None if the index cannot answer (unhashable value)
+        """
+        try:
+            bucket = self.buckets.get(value)
+        except TypeError:
+            return None
+        result = []
+        if bucket:
+            for obj_id, obj in list(bucket.items()):
+                if obj is None:
+                    obj = self.loader(obj_id)
+                if obj is not None:
+                    result.append(obj)
+        if self.unhashable:
+            result.extend(obj for obj in self.unhashable.values()
+                          if getattr(obj, self.attribute, None) == value)
+        return result
+
+    def clear(self):
+        """ Remove every object from the index
+        """
+        self.buckets.clear()
+        self.unhashable.clear()
+
+
+class _Top():
+    """ Greater than any ID: `key + (TOP,)` follows every entry of key
+    """
+
+    def __lt__(self, other) -> bool:
+        """ Never lower
+        """
+        return False
+
+    def __gt__(self, other) -> bool:
+        """ Always greater
+        """
+        return True
+
+
+TOP = _Top()
+
+
+def successor(prefix: str) -> Optional[str]:
+    """ Return the first string after every string starting with
+        prefix, or None if there is none
+    """
+    prefix = prefix.rstrip(chr(0x10ffff))
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class SortedIndex():
+    """ Keeps the IDs of the stored objects in the order of one
+        attribute, for range, prefix and suffix queries and ordered
+        iteration
+
+        Entries are `sort_key(value) + (ID,)` tuples in a sorted list;
+        with suffixes, a second list orders the string values reversed.
+        Additions are buffered and merged on the next query, so that
+        loading a store sorts once. Objects are resolved with
+        `loader(id)`; values without an order are kept apart.
+
+        An iteration reads the entries as of its first object: a change
+        meanwhile copies the list being read and changes the copy, so
+        an object moved to another key is neither repeated nor missed.
+    """
+
+    def __init__(self, attribute: str, loader: Callable,
+                 suffixes: bool = False):
+        """ Initialize an empty index on `attribute`
+        """
+        self.attribute = attribute
+        self.loader = loader
+        self.lock = threading.Lock()
+        self.entries = []
+        self.pending = []
+        self.reversed = [] if suffixes else None
+        self.reversed_pending = []
+        self.unordered = {}
+        # the list of entries being iterated under each name, with a
+        # token per reader
+        self.generations = {}
+
+    def add(self, obj: TypeVar('Base')):
+        """ Index an object under its current value
+        """
+        self.add_id(obj.id, getattr(obj, self.attribute, None))
+
+    def add_id(self, obj_id: str, value):
+        """ Index an object, loaded or not, under value
+        """
+        with self.lock:
+            self._add(obj_id, value)
+
+    def discard(self, obj: TypeVar('Base')):
+        """ Remove an object, indexed under its current value
+        """
+        with self.lock:
+            self._discard(obj.id, getattr(obj, self.attribute, None))
+
+    def move(self, obj: TypeVar('Base'), value):
+        """ Index an object under its current value instead of value,
+            in one turn: a scan finds it under one or the other
+        """
+        with self.lock:
+            self._discard(obj.id, value)
+            self._add(obj.id, getattr(obj, self.attribute, None))
+
+    def _add(self, obj_id: str, value):
+        """ Buffer the entries of an object under value, the lock being
+            held
+        """
+        key = sort_key(value)
+        if key is None:
+            self.unordered[obj_id] = True
+            return
+        self.pending.append(key + (obj_id,))
+        if self.reversed is not None and type(value) is str:
+            self.reversed_pending.append((value[::-1], obj_id))
+
+    def _discard(self, obj_id: str, value):
+        """ Remove the entries of an object under value, the lock being
+            held
+        """
+        key = sort_key(value)
+        if key is None:
+            self.unordered.pop(obj_id, None)
+            return
+        self._merge()
+        self._remove(self._writable('entries'), key + (obj_id,))
+        if self.reversed is not None and type(value) is str:
+            self._remove(self._writable('reversed'), (value[::-1], obj_id))
+
+    @staticmethod
+    def _remove(entries: list, entry: tuple):
+        """ Remove an entry from a sorted list
+        """
+        position = bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+
+    def _writable(self, name: str) -> list:
+        """ Return the list of entries `name` to change in place, a copy
+            if readers are iterating it; the lock being held
+        """
+        entries = getattr(self, name)
+        generation = self.generations.get(name)
+        if generation is not None and generation[0] is entries and \
+                generation[1]:
+            entries = list(entries)
+            setattr(self, name, entries)
+            del self.generations[name]
+        return entries
+
+    def _merge(self):
+        """ Merge the buffered additions, the lock being held
+        """
+        for name, pending in (('entries', self.pending),
+                              ('reversed', self.reversed_pending)):
+            if not pending:
+                continue
+            entries = self._writable(name)
+            if len(pending) <= MERGE_INSORT_MAX:
+                for entry in pending:
+                    position = bisect_left(entries, entry)
+                    if position == len(entries) or \
+                            entries[position] != entry:
+                        entries.insert(position, entry)
+            else:
+                entries.extend(pending)
+                entries.sort()
+                entries[:] = [entry for i, entry in enumerate(entries)
+                              if i == 0 or entry != entries[i - 1]]
+            pending.clear()
+
+    def clear(self):
+        """ Remove every object from the index
+        """
+        with self.lock:
+            # new lists: iterations keep reading the old ones
+            self.entries = []
+            self.pending.clear()
+            if self.reversed is not None:
+                self.reversed = []
+            self.reversed_pending.clear()
+            self.unordered = {}
+
+    def _bounds(self, entries: list, low: tuple, high: tuple) -> tuple:
+        """ Return the positions of the entries from low (included) to
+            high (excluded), the lock being held
+        """
+        start = 0 if low is None else bisect_left(entries, low)
+        stop = len(entries) if high is None else bisect_left(entries, high)
+        return start, stop
+
+    def _objects(self, name: str, low: tuple, high: tuple, reverse: bool,
+                 unordered: bool = False) -> Iterator[TypeVar('Base')]:
+        """ Yield the objects of the entries `name` from low (included)
+            to high (excluded), as of the first one, without holding the
+            lock; with unordered, the objects whose value has no order
+            come last (first in reverse)
+        """
+        token = object()
+        with self.lock:
+            self._merge()
+            entries = getattr(self, name)
+            generation = self.generations.get(name)
+            if generation is None or generation[0] is not entries:
+                generation = self.generations[name] = (entries, set())
+            generation[1].add(token)
+            start, stop = self._bounds(entries, low, high)
+            obj_ids = list(self.unordered) if unordered else []
+        try:
+            positions = range(stop - 1, start - 1, -1) if reverse else \
+                range(start, stop)
+            ids = (entries[position][-1] for position in positions)
+            for obj_id in chain(obj_ids, ids) if reverse else \
+                    chain(ids, obj_ids):
+                obj = self.loader(obj_id)
+                if obj is not None:
+                    yield obj
+        finally:
+            generation[1].discard(token)
+
+    def range(self, low=None, high=None, include_low: bool = True,
+              include_high: bool = True,
+              reverse: bool = False) -> Iterator[TypeVar('Base')]:
+        """ Yield the objects whose value is between low and high, in
+            order; a missing bound leaves that side open, but values of
+            another type than the bounds are never in the range
+        """
+        low_key = sort_key(low) if low is not None else None
+        high_key = sort_key(high) if high is not None else None
+        rank = (low_key or high_key or (None,))[0]
+        if low_key is not None:
+            low_key = low_key if include_low else low_key + (TOP,)
+        elif rank is not None:
+            low_key = (rank,)
+        if high_key is not None:
+            high_key = high_key + (TOP,) if include_high else high_key
+        elif rank is not None:
+            high_key = (rank + 1,)
+        return self._objects('entries', low_key, high_key, reverse)
+
+    def ordered(self, reverse: bool = False) -> Iterator[TypeVar('Base')]:
+        """ Yield every object in order, the ones whose value has no
+            order last
+        """
+        return self._objects('entries', None, None, reverse, True)
+
+    def prefix(self, prefix: str,
+               reverse: bool = False) -> Iterator[TypeVar('Base')]:
+        """ Yield the objects whose value starts with prefix, in order
+        """
+        end = successor(prefix)
+        return self._objects('entries', (2, prefix),
+                             (2, end) if end else (3,), reverse)
+
+    def suffix(self, suffix: str) -> Optional[Iterator[TypeVar('Base')]]:
+        """ Yield the objects whose value ends with suffix, or return
+            None if the index does not keep reversed values
+        """
+        if self.reversed is None:
+            return None
+        end = successor(suffix[::-1])
+        return self._objects('reversed', (suffix[::-1],),
+                             (end,) if end else None, False)
+
+    def select(self, condition: Condition,
+               reverse: bool = False) -> Optional[Iterator[TypeVar('Base')]]:
+        """ Yield the objects meeting a condition, or return None if
+            the index cannot answer it
+        """
+        if isinstance(condition, Range):
+            return self.range(condition.low, condition.high,
+                              condition.include_low, condition.include_high,
+                              reverse)
+        if isinstance(condition, Prefix):
+            return self.prefix(condition.prefix, reverse)
+        if isinstance(condition, Suffix):
+            return self.suffix(condition.suffix)
+        return None
+
+
+def trigrams(text: str) -> Set[str]:
+    """ Return the 3 characters substrings of a text
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex():
+    """ Maps the trigrams of the string values of one attribute,
+        lowercased, to the objects holding them, for substring queries
+
+        Objects get a number as they are added; each trigram keeps the
+        numbers of its objects in an ascending array, 4 bytes each. A
+        query walks the array of its rarest trigram and checks the
+        substring in the values, so it stops as soon as it has enough
+        results. Discarded numbers are only blanked out, and the index
+        is renumbered once they make up TRIGRAM_COMPACT_RATIO of it.
+    """
+
+    def __init__(self, attribute: str, loader: Callable):
+        """ Initialize an empty index on `attribute`
+        """
+        self.attribute = attribute
+        self.loader = loader
+        self.lock = threading.Lock()
+        self.postings = {}
+        self.ids = []
+        self.values = []
+        self.numbers = {}
+        self.discarded = 0
+
+    def add(self, obj: TypeVar('Base')):
+        """ Index an object under its current value
+        """
+        self.add_id(obj.id, getattr(obj, self.attribute, None))
+
+    def add_id(self, obj_id: str, value):
+        """ Index an object, loaded or not, under value, replacing the
+            value it was indexed under
+        """
+        with self.lock:
+            self._discard(obj_id)
+            if type(value) is str:
+                self._append(obj_id, value.lower())
+
+    def discard(self, obj: TypeVar('Base')):
+        """ Remove an object
+        """
+        with self.lock:
+            self._discard(obj.id)
+
+    def _append(self, obj_id: str, value: str):
+        """ Number an object and index its value, the lock being held
+        """
+        number = len(self.ids)
+        self.ids.append(obj_id)
+        self.values.append(value)
+        self.numbers[obj_id] = number
+        postings = self.postings
+        for trigram in trigrams(value):
+            numbers = postings.get(trigram)
+            if numbers is None:
+                numbers = postings[trigram] = array('I')
+            numbers.append(number)
+
+    def _discard(self, obj_id: str):
+        """ Blank the number of an object out, the lock being held
+        """
+        number = self.numbers.pop(obj_id, None)
+        if number is None:
+            return
+        self.ids[number] = None
+        self.values[number] = None
+        self.discarded += 1
+        if self.discarded > len(self.ids) * TRIGRAM_COMPACT_RATIO:
+            entries = [(obj_id, value)
+                       for obj_id, value in zip(self.ids, self.values)
+                       if obj_id is not None]
+            # new containers: running queries keep reading the old ones
+            self.postings = {}
+            self.ids = []
+            self.values = []
+            self.numbers = {}
+            self.discarded = 0
+            for obj_id, value in entries:
+                self._append(obj_id, value)
+
+    def clear(self):
+        """ Remove every object from the index
+        """
+        with self.lock:
+            self.postings = {}
+            self.ids = []
+            self.values = []
+            self.numbers = {}
+            self.discarded = 0
+
+    def contains(self, substring: str) -> Optional[Iterator[TypeVar('Base')]]:
+        """ Yield the objects whose value contains substring, ignoring
+            case, in the order they were indexed; return None if the
+            substring is too short to have a trigram
+        """
+        folded = substring.lower()
+        keys = trigrams(folded)
+        if not keys:
+            return None
+        with self.lock:
+            found = [self.postings.get(trigram) for trigram in keys]
+            ids, values = self.ids, self.values
+        if any(numbers is None for numbers in found):
+            return iter(())
+        return self._objects(min(found, key=len), ids, values, folded)
+
+    def _objects(self, numbers: array, ids: list, values: list,
+                 folded: str) -> Iterator[TypeVar('Base')]:
+        """ Yield the objects of numbers whose value contains folded
+        """
+        for number in numbers:
+            obj_id = ids[number]
+            value = values[number]
+            if obj_id is None or value is None or folded not in value:
+                continue
+            obj = self.loader(obj_id)
+            if obj is not None:
+                yield obj
+
+    def select(self, condition: Condition,
+               reverse: bool = False) -> Optional[Iterator[TypeVar('Base')]]:
+        """ Yield the objects meeting a condition, or return None if
+            the index cannot answer it
+        """
+        if isinstance(condition, Contains):
+            return self.contains(condition.substring)
+        return None
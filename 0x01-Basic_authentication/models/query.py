@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+""" Query module
+"""
+from datetime import datetime
+from typing import Optional
+
+
+def sort_key(value) -> Optional[tuple]:
+    """ Return the key ordering a value among values of any type:
+        None, then numbers, then strings and datetimes (as ISO strings,
+        which sort in time order), or None if the value has no order
+    """
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, datetime):
+        return (2, value.isoformat())
+    return None
+
+
+class Condition():
+    """ Condition on an attribute, given as a value to Base.search()
+        in place of the value to be equal to
+    """
+
+    def match(self, value) -> bool:
+        """ Check if an attribute value meets the condition
+        """
+        raise NotImplementedError
+
+
+class Range(Condition):
+    """ Value between low and high, bounds included unless told
+        otherwise; a missing bound leaves that side open
+        Only values of the type of the bounds are in a range.
+    """
+
+    def __init__(self, low=None, high=None, include_low: bool = True,
+                 include_high: bool = True):
+        """ Initialize a range
+        """
+        self.low = low
+        self.high = high
+        self.include_low = include_low
+        self.include_high = include_high
+
+    def match(self, value) -> bool:
+        """ Check if a value is in the range
+        """
+        key = sort_key(value)
+        low = sort_key(self.low) if self.low is not None else None
+        high = sort_key(self.high) if self.high is not None else None
+        if key is None or key[0] != (low or high or key)[0]:
+            return False
+        if self.low is not None and \
+                (key < low or (key == low and not self.include_low)):
+            return False
+        if self.high is not None and \
+                (key > high or (key == high and not self.include_high)):
+            return False
+        return True
+
+
+class Prefix(Condition):
+    """ String value starting with a prefix; datetimes match as ISO
+        strings, so "2024-05" selects a month
+    """
+
+    def __init__(self, prefix: str):
+        """ Initialize a prefix condition
+        """
+        self.prefix = prefix
+
+    def match(self, value) -> bool:
+        """ Check if a value starts with the prefix
+        """
+        key = sort_key(value)
+        return key is not None and key[0] == 2 and \
+            key[1].startswith(self.prefix)
+
+
+class Suffix(Condition):
+    """ String value ending with a suffix, like an email domain
+    """
+
+    def __init__(self, suffix: str):
+        """ Initialize a suffix condition
+        """
+        self.suffix = suffix
+
+    def match(self, value) -> bool:
+        """ Check if a value ends with the suffix
+        """
+        return isinstance(value, str) and value.endswith(self.suffix)
+
+
+class Contains(Condition):
+    """ String value containing a substring, ignoring case
+    """
+
+    def __init__(self, substring: str):
+        """ Initialize a substring condition
+        """
+        self.substring = substring
+        self.folded = substring.lower()
+
+    def match(self, value) -> bool:
+        """ Check if a value contains the substring
+        """
+        return isinstance(value, str) and self.folded in value.lower()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+""" Shared snapshot module
+"""
+import json
+import mmap
+import struct
+import zlib
+from typing import IO, Iterator, List, Optional
+
+
+MAGIC = b'BASESHM1'
+# offset and length of a record
+RECORD = struct.Struct('<QI')
+# record number + 1 (0 for an empty slot) and hash of the key
+SLOT = struct.Struct('<II')
+# length of the metadata, MAGIC
+TRAILER = struct.Struct('<I8s')
+
+
+def key_hash(value) -> Optional[int]:
+    """ Hash of an attribute value, the same in every process
+        (None for a value JSON cannot represent)
+    """
+    try:
+        return zlib.crc32(json.dumps(value, sort_keys=True).encode())
+    except (TypeError, ValueError):
+        return None
+
+
+class SharedSnapshot():
+    """ Read-only view of a .db_<Class>.shared file, memory-mapped so
+        that every process reads the same pages
+
+        The file holds the records (to_json(True) as JSON, in ID order),
+        a table of their offsets, an open-addressing hash table per
+        indexed attribute, the metadata as JSON and a trailer. Records
+        are decoded on each access, nothing is kept in memory.
+    """
+
+    def __init__(self, f: IO):
+        """ Map an open snapshot file
+        """
+        self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self.data)
+        meta_length, magic = TRAILER.unpack_from(self.data,
+                                                 size - TRAILER.size)
+        if magic != MAGIC or self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError("not a Base shared snapshot")
+        end = size - TRAILER.size
+        meta = json.loads(self.data[end - meta_length:end])
+        self.generation = meta['generation']
+        self.count = meta['count']
+        self.records = meta['records']
+        self.indexes = meta['indexes']
+
+    def __len__(self) -> int:
+        """ Number of records
+        """
+        return self.count
+
+    def raw(self, number: int) -> bytes:
+        """ Return the JSON of a record
+        """
+        offset, length = RECORD.unpack_from(
+            self.data, self.records + RECORD.size * number)
+        return self.data[offset:offset + length]
+
+    def record(self, number: int) -> dict:
+        """ Return a record decoded
+        """
+        return json.loads(self.raw(number))
+
+    def lookup(self, attribute: str, value) -> Optional[List[dict]]:
+        """ Return the records whose attribute equals value, or None if
+            the attribute has no index
+        """
+        value_hash = key_hash(value)
+        if attribute not in self.indexes or value_hash is None:
+            return None
+        offset, slots = self.indexes[attribute]
+        slot = value_hash & (slots - 1)
+        result = []
+        while True:
+            number, slot_hash = SLOT.unpack_from(self.data,
+                                                 offset + SLOT.size * slot)
+            if number == 0:
+                return result
+            if slot_hash == value_hash:
+                obj_json = self.record(number - 1)
+                if obj_json.get(attribute) == value:
+                    result.append(obj_json)
+            slot = (slot + 1) & (slots - 1)
+
+    def get(self, obj_id: str) -> Optional[dict]:
+        """ Return the record of an ID, or None
+        """
+        found = self.lookup('id', obj_id)
+        return found[0] if found else None
+
+    def bisect(self, obj_id: str) -> int:
+        """ Return the number of the first record with an ID after obj_id
+        """
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.record(middle)['id'] <= obj_id:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def scan(self, start: int = 0) -> Iterator[dict]:
+        """ Yield the records in ID order, from a record number
+        """
+        for number in range(start, self.count):
+            yield self.record(number)
@@ -42,8 +42,8 @@ def login():
 
         session_id = auth.create_session(user.id)
 
-        response_data = user.to_json()
-        response = make_response(jsonify(response_data))
+        response = make_response(user.to_json_bytes())
+        response.mimetype = 'application/json'
         session_name = getenv('SESSION_NAME', '_my_session_id')
         response.set_cookie(session_name, session_id)
 
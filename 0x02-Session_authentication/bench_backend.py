@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+""" Benchmark of the Base backends, file vs sqlite
+
+    Reports startup time and the latency of a save and of an email
+    lookup with `users` users stored.
+
+    Usage: ./bench_backend.py [users]
+"""
+import os
+import sys
+import tempfile
+import time
+from models.base import Base
+from models.user import User
+
+
+def measure(backend: str, count: int):
+    """ Store `count` users in a backend, printing the costs
+    """
+    Base.BACKEND = backend
+    User.load_from_file()
+    User.bulk_create({"email": "user{}@hbtn.io".format(i),
+                      "_password": "0" * 64,
+                      "first_name": "First{}".format(i),
+                      "last_name": "Last{}".format(i)}
+                     for i in range(count))
+
+    start = time.perf_counter()
+    User.load_from_file()
+    startup = time.perf_counter() - start
+
+    user = User.search({'email': "user{}@hbtn.io".format(count // 2)})[0]
+    rounds = 20
+    start = time.perf_counter()
+    for i in range(rounds):
+        user.first_name = "Bench{}".format(i)
+        user.save()
+    save = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    for i in range(rounds):
+        User.search({'email': "user{}@hbtn.io".format(i)})
+    lookup = (time.perf_counter() - start) / rounds
+    print("{:<6} startup {:6.2f} s, save {:8.2f} ms, lookup {:6.3f} ms"
+          .format(backend, startup, save * 1000, lookup * 1000))
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    os.chdir(tempfile.mkdtemp())
+    print("{} users".format(count))
+    measure("file", count)
+    measure("sqlite", count)
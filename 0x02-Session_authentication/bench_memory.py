@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+""" Benchmark of the memory held per User and UserSession object
+
+    Compares the slotted models with the former __dict__ layout,
+    where timestamps were datetime objects.
+
+    Usage: ./bench_memory.py [count]
+"""
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime
+from models.user import User
+from models.user_session import UserSession
+
+
+class DictUser():
+    """ User as laid out before: attributes in __dict__
+    """
+
+    def __init__(self):
+        """ Same attributes as a User
+        """
+        self.id = str(uuid.uuid4())
+        self.created_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+        self.email = None
+        self._password = None
+        self.first_name = None
+        self.last_name = None
+
+
+class DictUserSession():
+    """ UserSession as laid out before: attributes in __dict__
+    """
+
+    def __init__(self):
+        """ Same attributes as a UserSession
+        """
+        self.id = str(uuid.uuid4())
+        self.created_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+        self.user_id = None
+        self.session_id = None
+
+
+def bytes_per_object(factory, count: int) -> float:
+    """ Return the bytes allocated per object built by factory,
+        excluding the id strings shared by both layouts
+    """
+    ids = [str(uuid.uuid4()) for _ in range(count)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objs = []
+    for obj_id in ids:
+        obj = factory()
+        obj.id = obj_id
+        objs.append(obj)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / count
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for name, before, after in (("User", DictUser, User),
+                                ("UserSession", DictUserSession,
+                                 UserSession)):
+        old = bytes_per_object(before, count)
+        new = bytes_per_object(after, count)
+        print("{:<12} before {:6.0f} B/object, after {:6.0f} B/object"
+              .format(name, old, new))
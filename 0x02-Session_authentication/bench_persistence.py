@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+""" Benchmark of Base write latency, snapshot vs journal persistence
+
+    Usage: ./bench_persistence.py [size ...]   (default: 10000 1000000)
+"""
+import os
+import sys
+import tempfile
+import time
+from models.base import Base
+from models.user import User
+
+
+def populate(size: int):
+    """ Fill the User store with `size` users and write the snapshot
+    """
+    User.load_from_file()
+    for i in range(size):
+        user = User(email="user{}@hbtn.io".format(i))
+        User._store(user)
+    User.save_to_file()
+
+
+def write_latency(mode: str, writes: int) -> float:
+    """ Return the mean latency in ms of `writes` signups
+    """
+    Base.PERSISTENCE = mode
+    start = time.perf_counter()
+    for i in range(writes):
+        user = User(email="new{}@hbtn.io".format(i))
+        user.password = "pwd"
+        user.save()
+    return (time.perf_counter() - start) * 1000 / writes
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 1000000]
+    os.chdir(tempfile.mkdtemp())
+    for size in sizes:
+        populate(size)
+        snapshot = write_latency('snapshot', 3)
+        journal = write_latency('journal', 1000)
+        print("{:>9} users: snapshot {:10.2f} ms/write, "
+              "journal {:8.3f} ms/write".format(size, snapshot, journal))
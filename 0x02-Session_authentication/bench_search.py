@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+""" Benchmark of User.search_text(), trigram index vs a full scan
+
+    Reports the time to index the users and the time of a few queries
+    with the default limit of GET /api/v1/users/search.
+
+    Usage: ./bench_search.py [users...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from models.base import DATA
+from models.query import Contains
+from models.user import User
+
+
+FIRST_NAMES = ("Alice", "Bob", "Carol", "Dave", "Erin", "Frank", "Grace",
+               "Heidi", "Ivan", "Judy", "Mallory", "Niaj", "Olivia", "Peggy")
+LAST_NAMES = ("Smith", "Jones", "Garcia", "Miller", "Davis", "Lopez",
+              "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Martin")
+DOMAINS = ("hbtn.io", "example.com", "mail.org", "school.net")
+LIMIT = 100
+REPEAT = 20
+
+
+def fill(count: int) -> float:
+    """ Replace the stored users by `count` new ones, return the time
+        spent indexing them
+    """
+    User.load_from_file()
+    users = []
+    for i in range(count):
+        first_name = random.choice(FIRST_NAMES)
+        last_name = random.choice(LAST_NAMES)
+        user = User(id=str(uuid.uuid4()),
+                    created_at="2024-01-01T00:00:00",
+                    updated_at="2024-01-01T00:00:00",
+                    email="{}.{}{}@{}".format(first_name, last_name, i,
+                                              random.choice(DOMAINS)).lower(),
+                    first_name=first_name, last_name=last_name)
+        DATA['User'][user.id] = user
+        users.append(user)
+    start = time.perf_counter()
+    for user in users:
+        User._index(user)
+    return time.perf_counter() - start
+
+
+def timed(function) -> float:
+    """ Return the best time of REPEAT calls, in ms
+    """
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e3
+
+
+def scan(q: str) -> list:
+    """ search_text() without an index: the first LIMIT matches
+    """
+    condition = Contains(q)
+    result = []
+    for user in DATA['User'].values():
+        if any(condition.match(getattr(user, attribute))
+               for attribute in User.TEXT_ATTRIBUTES):
+            result.append(user)
+            if len(result) >= LIMIT:
+                break
+    return result
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [100000, 1000000]
+    os.chdir(tempfile.mkdtemp())
+    for count in counts:
+        print("{} users, indexed in {:.1f} s".format(count, fill(count)))
+        rare = "{}@".format(count // 2)
+        for q in (rare, "mallory", "smith", "xyz"):
+            print("  {:<16} index {:8.3f} ms, scan {:8.3f} ms".format(
+                repr(q), timed(lambda: User.search_text(q, LIMIT)),
+                timed(lambda: scan(q))))
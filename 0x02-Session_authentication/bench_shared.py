@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+""" Benchmark of the memory of API workers, each loading the user
+    store from a json snapshot vs mapping a shared one
+
+    Each worker is a new process that loads the store, serves lookups,
+    and reports how much its private memory (RssAnon) grew and the lookup
+    latency.
+
+    Usage: ./bench_shared.py [workers] [users...]
+"""
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from models.base import Base
+from models.user import User
+
+
+def private_memory() -> int:
+    """ Return the private resident memory of the process, in bytes
+    """
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def worker(count: int) -> tuple:
+    """ Load the store, look users up, return (memory, latency)
+    """
+    before = private_memory()
+    User.load_from_file()
+    rounds = 1000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        i = random.randrange(count)
+        User.search({'email': "user{}@hbtn.io".format(i)})
+    latency = (time.perf_counter() - start) / rounds
+    return private_memory() - before, latency
+
+
+def measure(snapshot_format: str, count: int, workers: int):
+    """ Write the store in a format and run workers on it
+    """
+    Base.SNAPSHOT_FORMAT = snapshot_format
+    User.load_from_file()
+    User.save_to_file()
+    os.environ['BASE_SNAPSHOT_FORMAT'] = snapshot_format
+    # spawned, so that no worker reuses memory freed by this process
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, maxtasksperchild=1) as pool:
+        results = pool.map(worker, [count] * workers)
+    memory = sum(result[0] for result in results) / workers
+    latency = sum(result[1] for result in results) / workers
+    print("  {:<6} {:8.1f} MB private per worker, lookup {:6.3f} ms"
+          .format(snapshot_format, memory / 1e6, latency * 1000))
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    counts = [int(arg) for arg in sys.argv[2:]] or [10000, 100000]
+    os.chdir(tempfile.mkdtemp())
+    for count in counts:
+        print("{} users, {} workers".format(count, workers))
+        Base.SNAPSHOT_FORMAT = 'json'
+        User.load_from_file()
+        User.bulk_create({"email": "user{}@hbtn.io".format(i),
+                          "_password": "0" * 64,
+                          "first_name": "First{}".format(i),
+                          "last_name": "Last{}".format(i)}
+                         for i in range(count))
+        User.save_to_file()
+        for snapshot_format in ("json", "shared"):
+            measure(snapshot_format, count, workers)
+        for name in os.listdir("."):
+            os.remove(name)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+""" Benchmark of the .db_User snapshot formats, JSON vs binary
+
+    Reports save time, load time and file size of each format.
+
+    Usage: ./bench_snapshot.py [users...]
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+from models.base import Base, DATA
+from models.user import User
+
+
+def fill(count: int):
+    """ Replace the stored users by `count` new ones
+    """
+    User.load_from_file()
+    for i in range(count):
+        user = User(id=str(uuid.uuid4()),
+                    created_at="2024-01-01T00:00:00",
+                    updated_at="2024-01-01T00:00:00",
+                    email="user{}@hbtn.io".format(i),
+                    first_name="First{}".format(i),
+                    last_name="Last{}".format(i))
+        user._password = "0" * 64
+        DATA['User'][user.id] = user
+        User._index(user)
+
+
+def measure(snapshot_format: str):
+    """ Save and load the stored users in a format, printing the costs
+    """
+    Base.SNAPSHOT_FORMAT = snapshot_format
+    start = time.perf_counter()
+    User.save_to_file()
+    save = time.perf_counter() - start
+    size = os.path.getsize(User._snapshot_path())
+
+    start = time.perf_counter()
+    User.load_from_file()
+    load = time.perf_counter() - start
+    print("  {:<6} save {:6.2f} s, load {:6.2f} s, {:8.1f} MB".format(
+        snapshot_format, save, load, size / 1e6))
+    os.remove(User._snapshot_path())
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [100000, 1000000]
+    os.chdir(tempfile.mkdtemp())
+    for count in counts:
+        print("{} users".format(count))
+        for snapshot_format in ("json", "binary"):
+            fill(count)
+            measure(snapshot_format)
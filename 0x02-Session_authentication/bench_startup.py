@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+""" Benchmark of User.load_from_file, eager vs lazy loading
+
+    Reports startup time, peak Python memory and the latency of the
+    first lookups after startup.
+
+    Usage: ./bench_startup.py [users]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from models.base import Base
+from models.user import User
+
+
+def write_store(count: int) -> str:
+    """ Write a .db_User.json with `count` users, return an email
+    """
+    objs = {}
+    for i in range(count):
+        obj_id = str(uuid.uuid4())
+        objs[obj_id] = {"id": obj_id,
+                        "created_at": "2024-01-01T00:00:00",
+                        "updated_at": "2024-01-01T00:00:00",
+                        "email": "user{}@hbtn.io".format(i),
+                        "_password": "0" * 64,
+                        "first_name": "First{}".format(i),
+                        "last_name": "Last{}".format(i)}
+    with open(".db_User.json", "w") as f:
+        json.dump(objs, f)
+    return "user{}@hbtn.io".format(count // 2)
+
+
+def measure(lazy: bool, email: str):
+    """ Load the store and look a user up, printing the costs
+    """
+    Base.LAZY_LOAD = lazy
+    # tracing slows allocation down: time and trace separate loads
+    tracemalloc.start()
+    User.load_from_file()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    User.load_from_file()
+    startup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    user = User.search({'email': email})[0]
+    User.get(user.id)
+    lookup = time.perf_counter() - start
+    print("{:<6} startup {:7.2f} s, peak {:8.1f} MB, first lookup "
+          "{:7.3f} ms".format("lazy" if lazy else "eager", startup,
+                              peak / 1e6, lookup * 1000))
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    os.chdir(tempfile.mkdtemp())
+    email = write_store(count)
+    print("{} users, {:.1f} MB file".format(
+        count, os.path.getsize(".db_User.json") / 1e6))
+    measure(False, email)
+    measure(True, email)
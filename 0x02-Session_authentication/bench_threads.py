@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+""" Benchmark of full scans of the User store under concurrent writes
+
+    Reader threads walk User.all() and scan with User.search() while
+    writer threads create and remove users, as a threaded server does.
+    Reports the operations done and the errors raised by readers.
+
+    Usage: ./bench_threads.py [users] [seconds]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from models.base import Base
+from models.user import User
+
+
+READERS = 4
+WRITERS = 2
+
+
+def read(stop: threading.Event, counts: dict):
+    """ Scan every user until stopped, counting scans and errors
+    """
+    while not stop.is_set():
+        try:
+            total = sum(1 for _ in User.all())
+            User.search({'first_name': "nobody"})
+            counts['reads'] += 1
+            counts['seen'] = min(counts['seen'] or total, total)
+        except RuntimeError:
+            counts['errors'] += 1
+
+
+def write(stop: threading.Event, counts: dict, number: int):
+    """ Create and remove users until stopped, counting them
+    """
+    i = 0
+    while not stop.is_set():
+        user = User(email="writer{}_{}@hbtn.io".format(number, i))
+        user.save()
+        user.remove()
+        counts['writes'] += 2
+        i += 1
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    os.chdir(tempfile.mkdtemp())
+    Base.PERSISTENCE = 'journal'
+    User.load_from_file()
+    User.bulk_create({'email': "user{}@hbtn.io".format(i)}
+                     for i in range(count))
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0, 'errors': 0, 'seen': None}
+    threads = [threading.Thread(target=read, args=(stop, counts))
+               for _ in range(READERS)]
+    threads += [threading.Thread(target=write, args=(stop, counts, number))
+                for number in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    print("{} users, {} readers, {} writers, {:.0f} s".format(
+        count, READERS, WRITERS, seconds))
+    print("  {reads} scans, {writes} writes, {errors} reader errors, "
+          "fewest users seen {seen}".format(**counts))
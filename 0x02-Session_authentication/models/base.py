@@ -1,37 +1,152 @@
 #!/usr/bin/env python3
 """ Base module
 """
-from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from bisect import bisect_left, bisect_right
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from itertools import chain, islice
+from typing import TypeVar, List, Iterable, Iterator
+from os import getenv, path
+import heapq
 import json
+import mmap
+import os
+import re
+import tempfile
+import threading
 import uuid
+from models.file_lock import FileLock
+from models.index import (MERGE_INSORT_MAX, HashIndex, SortedIndex,
+                          TrigramIndex)
+from models.query import Condition, Contains, Suffix, sort_key
+from models.serializers import SERIALIZERS, TIMESTAMP_SLOTS
+from models.shared_snapshot import SharedSnapshot
+from models.sqlite_store import SQLiteStore
+from models.write_behind import WriteBehind
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+EPOCH = datetime(1970, 1, 1)
+ONE_SECOND = timedelta(seconds=1)
 DATA = {}
+# Copy-on-write generations of DATA: the dict of a class being iterated,
+# with a token per reader; a write meanwhile copies it and publishes the
+# copy, so the generation being read never changes. Writers of a class
+# take turns on its lock, held for the change in memory only.
+READ_GENERATIONS = {}
+STORE_LOCKS = {}
+# Writers of the files of a class take turns on its persistence lock,
+# held from the snapshot capture to the journal truncation, and around
+# each journal append. Locks are taken in this order: file lock,
+# persistence lock, store lock, LAZY_LOCK.
+PERSIST_LOCKS = {}
+INDEXES = {}
+# Sorted and trigram indexes of each class, by attribute: only the ones
+# built so far, on the first search() that needs them
+SORTED_INDEXES = {}
+TEXT_INDEXES = {}
+JOURNAL_COUNTS = {}
+# IDs of each class in order for page(), built on first use and then
+# kept up to date by the writers; read and written under the store lock
+SORTED_IDS = {}
+WRITE_BEHIND = WriteBehind()
+# Multi-process mode: the lock of each class, and what this process has
+# read of its files: (snapshot identity, journal offset)
+FILE_LOCKS = {}
+SYNC_STATE = {}
+# Lazy loading: (start, end) offsets of the objects not materialized yet,
+# and the memory-mapped snapshot they are read from
+LAZY = {}
+LAZY_FILES = {}
+LAZY_LOCK = threading.RLock()
+# One `"id": {...}` member of a snapshot, the object holding flat values
+LAZY_MEMBER = re.compile(rb'"((?:[^"\\]+|\\.)*)": '
+                         rb'(\{(?:[^"{}]+|"(?:[^"\\]+|\\.)*")*\})')
+JSON_DECODER = json.JSONDecoder()
+# "shared" snapshots: the mapped snapshot of each class, read in place,
+# and the IDs of its records removed since; DATA only holds the objects
+# written since
+SHARED = {}
+SHARED_REMOVED = {}
+# Backends other than "file", the in-memory store persisted to .db_ files
+BACKENDS = {'sqlite': SQLiteStore(getenv('BASE_SQLITE_PATH',
+                                         '.db_base.sqlite3'))}
+
+
+def timestamp_seconds(value: str) -> int:
+    """ Parse a TIMESTAMP_FORMAT string into seconds since EPOCH
+        fromisoformat is much faster than strptime for this format
+    """
+    if len(value) == 19 and value[10] == 'T':
+        moment = datetime.fromisoformat(value)
+    else:
+        moment = datetime.strptime(value, TIMESTAMP_FORMAT)
+    return (moment - EPOCH) // ONE_SECOND
 
 
 class Base():
     """ Base class
     """
 
+    # Attributes live in slots, timestamps as integer seconds since
+    # EPOCH; FIELDS lists the serialized attributes, in order.
+    # _json_cache holds the public JSON forms until an attribute is set
+    __slots__ = ('id', '_created_ts', '_updated_ts', '_json_cache')
+    FIELDS = ('id', 'created_at', 'updated_at')
+
+    # Attributes looked up through a hash index by search()
+    INDEXED_ATTRIBUTES = ()
+    # Attributes kept in order for range and prefix conditions and
+    # order_by in search(); SUFFIX_ATTRIBUTES also answer suffixes
+    SORTED_ATTRIBUTES = ()
+    SUFFIX_ATTRIBUTES = ()
+    # Attributes kept in a trigram index for search_text() and Contains
+    # conditions in search()
+    # Both are built on first use, so that loading and the processes
+    # that never run such a search do not pay for them
+    TEXT_ATTRIBUTES = ()
+    # "file" keeps objects in memory, persisted to .db_<Class> files by
+    # the settings below; any other name is a key of BACKENDS
+    BACKEND = getenv('BASE_BACKEND', 'file')
+    # "snapshot" rewrites .db_<Class>.json on every write, "journal"
+    # appends to .db_<Class>.journal and compacts every N records
+    PERSISTENCE = getenv('BASE_PERSISTENCE', 'snapshot')
+    JOURNAL_COMPACT_EVERY = int(getenv('BASE_JOURNAL_COMPACT_EVERY', 1000))
+    # "sync" persists every write before returning, "group" batches
+    # concurrent writers into one flush, "periodic" returns at once and
+    # leaves the write to the background flusher
+    DURABILITY = getenv('BASE_DURABILITY', 'sync')
+    FLUSH_INTERVAL_MS = int(getenv('BASE_FLUSH_INTERVAL_MS', 100))
+    FLUSH_MAX_CHANGES = int(getenv('BASE_FLUSH_MAX_CHANGES', 1000))
+    # Only index the snapshot at load time, build objects on first access
+    # (JSON snapshots only)
+    LAZY_LOAD = getenv('BASE_LAZY_LOAD', '0') == '1'
+    # Snapshot serializer: "json" (.db_<Class>.json), "binary" (.bin)
+    # or "shared" (.shared, read in place by every process)
+    SNAPSHOT_FORMAT = getenv('BASE_SNAPSHOT_FORMAT', 'json')
+    # Share the .db_ files between processes: writes are appended to
+    # the journal under a file lock, and reads first replay what other
+    # processes appended (or reload after a compaction)
+    # Always on with a "shared" snapshot, which every process maps
+    MULTI_PROCESS = getenv('BASE_MULTI_PROCESS', '0') == '1'
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
         if DATA.get(s_class) is None:
             DATA[s_class] = {}
+        self.__class__._indexes()
+        self.__class__._sorted_indexes()
+        self.__class__._text_indexes()
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self._created_ts = timestamp_seconds(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self._updated_ts = timestamp_seconds(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
@@ -44,11 +159,200 @@ class Base():
             return False
         return (self.id == other.id)
 
+    @property
+    def created_at(self) -> datetime:
+        """ Getter of the creation time
+        """
+        return EPOCH + timedelta(seconds=self._created_ts)
+
+    @created_at.setter
+    def created_at(self, value: datetime):
+        """ Setter of the creation time, kept to the second
+        """
+        self._created_ts = int((value - EPOCH).total_seconds())
+
+    @property
+    def updated_at(self) -> datetime:
+        """ Getter of the last update time
+        """
+        return EPOCH + timedelta(seconds=self._updated_ts)
+
+    @updated_at.setter
+    def updated_at(self, value: datetime):
+        """ Setter of the last update time, kept to the second
+        """
+        self._updated_ts = int((value - EPOCH).total_seconds())
+
+    def __setattr__(self, name: str, value):
+        """ Set an attribute, keeping the indexes of stored objects
+            up to date and dropping the cached JSON forms
+        """
+        if (name not in self.INDEXED_ATTRIBUTES and
+                name not in self.SORTED_ATTRIBUTES and
+                name not in self.TEXT_ATTRIBUTES) or \
+                not self._is_stored():
+            super().__setattr__(name, value)
+        else:
+            cls = self.__class__
+            # no index is built meanwhile with the value being replaced
+            with cls._store_lock():
+                index = cls._indexes().get(name)
+                sorted_index = cls._sorted_indexes().get(name)
+                text_index = cls._text_indexes().get(name)
+                previous = getattr(self, name, None)
+                if index is not None:
+                    index.discard(self)
+                super().__setattr__(name, value)
+                if index is not None:
+                    index.add(self)
+                # moved in one turn: scans find the object under the
+                # old value or the new one
+                if sorted_index is not None:
+                    sorted_index.move(self, previous)
+                if text_index is not None:
+                    text_index.add(self)
+        # after the write: a form cached meanwhile is dropped too
+        object.__setattr__(self, '_json_cache', None)
+
+    def _cache(self) -> dict:
+        """ Return the cache of the public JSON forms
+        """
+        cache = getattr(self, '_json_cache', None)
+        if cache is None:
+            cache = {}
+            object.__setattr__(self, '_json_cache', cache)
+        return cache
+
+    def _is_stored(self) -> bool:
+        """ Check if this very instance is the one held in DATA
+        """
+        objs = DATA.get(self.__class__.__name__)
+        return objs is not None and \
+            objs.get(getattr(self, 'id', None)) is self
+
+    @classmethod
+    def _indexes(cls) -> dict:
+        """ Return the indexes of the class, by attribute
+        """
+        s_class = cls.__name__
+        if INDEXES.get(s_class) is None:
+            INDEXES[s_class] = {attribute: HashIndex(attribute,
+                                                     cls._materialize)
+                                for attribute in cls.INDEXED_ATTRIBUTES}
+        return INDEXES[s_class]
+
+    @classmethod
+    def _sorted_indexes(cls) -> dict:
+        """ Return the sorted indexes of the class built so far, by
+            attribute
+        """
+        return SORTED_INDEXES.setdefault(cls.__name__, {})
+
+    @classmethod
+    def _text_indexes(cls) -> dict:
+        """ Return the trigram indexes of the class built so far, by
+            attribute
+        """
+        return TEXT_INDEXES.setdefault(cls.__name__, {})
+
+    @classmethod
+    def _sorted_index(cls, attribute: str) -> SortedIndex:
+        """ Return the sorted index of an attribute, built on first use,
+            or None if it is not one of SORTED_ATTRIBUTES
+        """
+        if attribute not in cls.SORTED_ATTRIBUTES:
+            return None
+        indexes = cls._sorted_indexes()
+        if attribute not in indexes:
+            cls._build_index(indexes, SortedIndex(
+                attribute, cls._stored, attribute in cls.SUFFIX_ATTRIBUTES))
+        return indexes[attribute]
+
+    @classmethod
+    def _text_index(cls, attribute: str) -> TrigramIndex:
+        """ Return the trigram index of an attribute, built on first
+            use, or None if it is not one of TEXT_ATTRIBUTES
+        """
+        if attribute not in cls.TEXT_ATTRIBUTES:
+            return None
+        indexes = cls._text_indexes()
+        if attribute not in indexes:
+            cls._build_index(indexes, TrigramIndex(attribute, cls._stored))
+        return indexes[attribute]
+
+    @classmethod
+    def _build_index(cls, indexes: dict, index):
+        """ Fill a new index with the objects in memory, the lazy ones
+            from their snapshot bytes, and publish it in indexes:
+            writers keep it up to date from then on
+        """
+        s_class = cls.__name__
+        with cls._store_lock(), LAZY_LOCK:
+            if index.attribute in indexes:
+                return
+            for obj in DATA[s_class].values():
+                index.add(obj)
+            for obj_id, span in LAZY.get(s_class, {}).items():
+                values = JSON_DECODER.decode(
+                    LAZY_FILES[s_class][span[0]:span[1]].decode())
+                index.add_id(obj_id, values.get(index.attribute))
+            indexes[index.attribute] = index
+
+    @classmethod
+    def _every_index(cls) -> list:
+        """ Return the hash, sorted and trigram indexes of the class
+        """
+        return list(cls._indexes().values()) + \
+            list(cls._sorted_indexes().values()) + \
+            list(cls._text_indexes().values())
+
+    @classmethod
+    def _index(cls, obj: TypeVar('Base')):
+        """ Add an object to every index of the class
+        """
+        for index in cls._every_index():
+            index.add(obj)
+
+    @classmethod
+    def _unindex(cls, obj: TypeVar('Base')):
+        """ Remove an object from every index of the class
+        """
+        for index in cls._every_index():
+            index.discard(obj)
+
+    @classmethod
+    def _stored(cls, obj_id: str) -> TypeVar('Base'):
+        """ Return the object of an ID held in DATA or still lazy
+        """
+        obj = DATA[cls.__name__].get(obj_id)
+        if obj is None:
+            obj = cls._materialize(obj_id)
+        return obj
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
+            The public form is cached until an attribute is set
+        """
+        if not for_serialization:
+            cache = self._cache()
+            if 'dict' not in cache:
+                cache['dict'] = self._to_json()
+            return dict(cache['dict'])
+        return self._to_json(True)
+
+    def to_json_bytes(self) -> bytes:
+        """ Return the public JSON form encoded, cached like to_json()
+        """
+        cache = self._cache()
+        if 'bytes' not in cache:
+            cache['bytes'] = json.dumps(self.to_json()).encode()
+        return cache['bytes']
+
+    def _to_json(self, for_serialization: bool = False) -> dict:
+        """ Build the JSON dictionary of the object
         """
         result = {}
-        for key, value in self.__dict__.items():
+        for key, value in self._attributes():
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -57,81 +361,832 @@ class Base():
                 result[key] = value
         return result
 
+    @classmethod
+    def _store_lock(cls) -> threading.RLock:
+        """ Return the lock the writers of the class take turns on
+        """
+        lock = STORE_LOCKS.get(cls.__name__)
+        if lock is None:
+            lock = STORE_LOCKS.setdefault(cls.__name__, threading.RLock())
+        return lock
+
+    @classmethod
+    def _persist_lock(cls) -> threading.RLock:
+        """ Return the lock the writers of the class files take turns on
+        """
+        lock = PERSIST_LOCKS.get(cls.__name__)
+        if lock is None:
+            lock = PERSIST_LOCKS.setdefault(cls.__name__, threading.RLock())
+        return lock
+
+    @classmethod
+    def _generation(cls) -> Iterator[TypeVar('Base')]:
+        """ Yield the objects in memory as of the first one, without
+            holding a lock: writes meanwhile go to a copy
+        """
+        s_class = cls.__name__
+        token = object()
+        with cls._store_lock():
+            objs = DATA[s_class]
+            generation = READ_GENERATIONS.get(s_class)
+            if generation is None or generation[0] is not objs:
+                generation = READ_GENERATIONS[s_class] = (objs, set())
+            generation[1].add(token)
+        try:
+            yield from objs.values()
+        finally:
+            generation[1].discard(token)
+
+    @classmethod
+    def _writable(cls) -> dict:
+        """ Return the objects in memory by ID to change in place, a
+            copy if readers are iterating them; the store lock being held
+        """
+        s_class = cls.__name__
+        objs = DATA[s_class]
+        generation = READ_GENERATIONS.get(s_class)
+        if generation is not None and generation[0] is objs and \
+                generation[1]:
+            objs = DATA[s_class] = dict(objs)
+            del READ_GENERATIONS[s_class]
+        return objs
+
+    @classmethod
+    def _store(cls, obj: TypeVar('Base')):
+        """ Put an object in DATA and the indexes, replacing any
+            other instance with the same ID
+        """
+        with cls._store_lock():
+            old = DATA[cls.__name__].get(obj.id)
+            if old is None:
+                old = cls._materialize(obj.id)
+            ids = SORTED_IDS.get(cls.__name__)
+            if old is None and ids is not None:
+                position = bisect_left(ids, obj.id)
+                if position == len(ids) or ids[position] != obj.id:
+                    ids.insert(position, obj.id)
+            SHARED_REMOVED.get(cls.__name__, set()).discard(obj.id)
+            if old is not obj:
+                if old is not None:
+                    cls._unindex(old)
+                cls._writable()[obj.id] = obj
+                cls._index(obj)
+
+    @classmethod
+    def _discard(cls, obj_id: str) -> bool:
+        """ Remove an object from DATA and the indexes, or from the
+            shared snapshot
+        """
+        s_class = cls.__name__
+        with cls._store_lock():
+            cls._materialize(obj_id)
+            shared = cls._shared_get(obj_id) is not None
+            if shared:
+                SHARED_REMOVED[s_class].add(obj_id)
+            if obj_id not in DATA[s_class]:
+                return shared
+            obj = cls._writable().pop(obj_id)
+            cls._unindex(obj)
+            ids = SORTED_IDS.get(s_class)
+            if ids is not None:
+                position = bisect_left(ids, obj_id)
+                if position < len(ids) and ids[position] == obj_id:
+                    del ids[position]
+            return True
+
+    @classmethod
+    def _shared_get(cls, obj_id: str) -> TypeVar('Base'):
+        """ Build an object from the shared snapshot, or return None if
+            the snapshot does not hold it (anymore)
+        """
+        s_class = cls.__name__
+        shared = SHARED.get(s_class)
+        if shared is None or obj_id in SHARED_REMOVED[s_class]:
+            return None
+        obj_json = shared.get(obj_id)
+        return cls(**obj_json) if obj_json is not None else None
+
+    @classmethod
+    def _shared_search(cls, attributes: dict) -> List[TypeVar('Base')]:
+        """ Return the objects of the shared snapshot that may match
+            attributes, but the ones replaced or removed since
+        """
+        s_class = cls.__name__
+        shared = SHARED[s_class]
+        skip = SHARED_REMOVED[s_class]
+        found = None
+        for k, v in attributes.items():
+            found = shared.lookup(k, v)
+            if found is not None:
+                break
+        if found is None:
+            found = shared.scan()
+        result = []
+        for obj_json in found:
+            if obj_json['id'] in skip or obj_json['id'] in DATA[s_class]:
+                continue
+            if any(k in obj_json and obj_json[k] != v
+                   for k, v in attributes.items()
+                   if k not in TIMESTAMP_SLOTS and
+                   not isinstance(v, Condition)):
+                continue
+            result.append(cls(**obj_json))
+        return result
+
+    def _attributes(self) -> Iterable[tuple]:
+        """ Yield the (name, value) pairs of the set attributes:
+            FIELDS first, then any attribute without a slot
+        """
+        for key in self.FIELDS:
+            try:
+                yield key, getattr(self, key)
+            except AttributeError:
+                continue
+        yield from getattr(self, '__dict__', {}).items()
+
+    @classmethod
+    def _materialize(cls, obj_id: str) -> TypeVar('Base'):
+        """ Build an object that is still lazy from its snapshot bytes
+            and return it (or None if it is not a lazy object)
+        """
+        s_class = cls.__name__
+        if not LAZY.get(s_class):
+            return None
+        with cls._store_lock(), LAZY_LOCK:
+            span = LAZY[s_class].pop(obj_id, None)
+            if span is None:
+                return DATA[s_class].get(obj_id)
+            data = LAZY_FILES[s_class][span[0]:span[1]]
+            obj = cls(**json.loads(data))
+            cls._writable()[obj_id] = obj
+            cls._index(obj)
+            return obj
+
+    @classmethod
+    def _materialize_all(cls):
+        """ Build every object that is still lazy
+        """
+        for obj_id in list(LAZY.get(cls.__name__, ())):
+            cls._materialize(obj_id)
+
+    @classmethod
+    def _load_lazy(cls, file_path: str) -> bool:
+        """ Memory-map a snapshot and record where each object is,
+            indexing the declared attributes without building objects
+            Return False if the file is not laid out as expected
+        """
+        s_class = cls.__name__
+        with open(file_path, 'rb') as f:
+            if path.getsize(file_path) == 0:
+                return False
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        indexes = cls._every_index()
+        offsets = {}
+        position = data.find(b'{') + 1
+        for match in LAZY_MEMBER.finditer(data, position):
+            if data[position:match.start()].strip(b', \t\r\n'):
+                return False
+            key = match.group(1)
+            obj_id = key.decode() if b'\\' not in key else \
+                json.loads(b'"' + key + b'"')
+            offsets[obj_id] = match.span(2)
+            if indexes:
+                values = JSON_DECODER.decode(match.group(2).decode())
+                for index in indexes:
+                    index.add_id(obj_id, values.get(index.attribute))
+            position = match.end()
+        if data[position:].strip() != b'}':
+            return False
+
+        LAZY_FILES[s_class] = data
+        LAZY[s_class] = offsets
+        return True
+
+    @classmethod
+    def _snapshot_path(cls, snapshot_format: str = None) -> str:
+        """ Return the snapshot file of the class for a format
+        """
+        serializer = SERIALIZERS[snapshot_format or cls.SNAPSHOT_FORMAT]
+        return ".db_{}.{}".format(cls.__name__, serializer.extension)
+
     @classmethod
     def load_from_file(cls):
         """ Load all objects from file
+            In journal mode, the journal is replayed over the snapshot
+            With LAZY_LOAD, objects are built on first access
+            A snapshot found only in another format is migrated
+        """
+        backend = BACKENDS.get(cls.BACKEND)
+        if backend is not None:
+            backend.load(cls)
+            return
+        cls.flush()
+        # a snapshot to migrate is rewritten: the files are locked
+        # exclusively from the start, so no process writes in between
+        migrate = cls._snapshot_format() != cls.SNAPSHOT_FORMAT
+        with cls._file_lock(migrate), cls._persist_lock(), \
+                cls._store_lock():
+            cls._load(migrate)
+
+    @classmethod
+    def _snapshot_format(cls) -> str:
+        """ Return the format of the snapshot of the class: the one of
+            SNAPSHOT_FORMAT unless only another format has a file
+        """
+        if not path.exists(cls._snapshot_path()):
+            for other in SERIALIZERS:
+                if path.exists(cls._snapshot_path(other)):
+                    return other
+        return cls.SNAPSHOT_FORMAT
+
+    @classmethod
+    def _load(cls, migrate: bool = False):
+        """ Replace the objects in memory by the ones of the files,
+            the persistence and store locks being held
+            With migrate, a snapshot in another format is rewritten in
+            SNAPSHOT_FORMAT: the file lock must be held exclusively
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
         DATA[s_class] = {}
-        if not path.exists(file_path):
+        for index in cls._every_index():
+            index.clear()
+        # built again by the first search that needs them
+        cls._sorted_indexes().clear()
+        cls._text_indexes().clear()
+        LAZY.pop(s_class, None)
+        SHARED.pop(s_class, None)
+        SHARED_REMOVED[s_class] = set()
+        SORTED_IDS.pop(s_class, None)
+        JOURNAL_COUNTS[s_class] = 0
+
+        snapshot_format = cls._snapshot_format()
+        file_path = cls._snapshot_path(snapshot_format)
+
+        lazy = cls.LAZY_LOAD and snapshot_format == 'json' and \
+            path.exists(file_path) and cls._load_lazy(file_path)
+        if not lazy:
+            for index in cls._every_index():
+                index.clear()
+        mapped = snapshot_format == cls.SNAPSHOT_FORMAT and \
+            getattr(SERIALIZERS[snapshot_format], 'mapped', False)
+        if mapped and path.exists(file_path):
+            with open(file_path, 'rb') as f:
+                SHARED[s_class] = SharedSnapshot(f)
+        elif not lazy and path.exists(file_path):
+            serializer = SERIALIZERS[snapshot_format]
+            with open(file_path, 'rb' if serializer.binary else 'r') as f:
+                for obj in serializer.load(cls, f):
+                    DATA[s_class][obj.id] = obj
+                    cls._index(obj)
+        SYNC_STATE[s_class] = (cls._snapshot_identity(file_path),
+                               cls._replay_journal())
+
+        if migrate and snapshot_format != cls.SNAPSHOT_FORMAT:
+            cls.save_to_file()
+            os.remove(file_path)
+
+    @classmethod
+    def _replay_journal(cls, offset: int = 0, skip: set = ()) -> int:
+        """ Apply the records of the journal file from offset, in order,
+            but the ones about the IDs in skip
+            Return the offset after the last complete record
+        """
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        if not path.exists(journal_path):
+            return 0
+
+        with open(journal_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if record is None or not line.endswith(b'\n'):
+                    # torn last record of an interrupted append
+                    break
+                offset += len(line)
+                JOURNAL_COUNTS[s_class] += 1
+                if record.get('id', record.get('obj', {}).get('id')) \
+                        not in skip:
+                    cls._apply(record)
+        return offset
+
+    @classmethod
+    def _apply(cls, record: dict):
+        """ Apply a journal record in memory
+        """
+        if record['op'] == 'save':
+            cls._store(cls(**record['obj']))
+        elif record['op'] == 'remove':
+            cls._discard(record['id'])
+
+    @classmethod
+    def _multi_process(cls) -> bool:
+        """ Check if the files of the class are shared between processes:
+            with MULTI_PROCESS, or a snapshot every process maps, which
+            a worker must not rewrite from a stale mapping
+        """
+        return cls.MULTI_PROCESS or \
+            getattr(SERIALIZERS[cls.SNAPSHOT_FORMAT], 'mapped', False)
+
+    @classmethod
+    def _file_lock(cls, exclusive: bool = False):
+        """ Return a context holding the lock of the class files in
+            multi-process mode, doing nothing otherwise
+        """
+        if not cls._multi_process():
+            return nullcontext()
+        s_class = cls.__name__
+        if FILE_LOCKS.get(s_class) is None:
+            FILE_LOCKS[s_class] = FileLock(".db_{}.lock".format(s_class))
+        return FILE_LOCKS[s_class].hold(exclusive)
+
+    @staticmethod
+    def _snapshot_identity(file_path: str) -> tuple:
+        """ Return what changes when a snapshot file is rewritten
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    @classmethod
+    def _sync(cls, records: List[dict] = ()):
+        """ Catch up with the writes of other processes in multi-process
+            mode: replay the journal records appended since the last
+            sync, or reload everything if the snapshot was rewritten
+            `records` are writes of this process not appended yet: they
+            come after the ones found, so they win
+        """
+        if not cls._multi_process() or \
+                (not records and not cls._changed()):
             return
+        s_class = cls.__name__
+        with cls._file_lock(), cls._persist_lock(), cls._store_lock():
+            changed = cls._changed()
+            if changed == 'reload':
+                cls._load()
+                for record in records:
+                    cls._apply(record)
+            elif changed == 'journal':
+                skip = {record.get('id', record.get('obj', {}).get('id'))
+                        for record in records}
+                offset = SYNC_STATE[s_class][1]
+                SYNC_STATE[s_class] = (SYNC_STATE[s_class][0],
+                                       cls._replay_journal(offset, skip))
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+    @classmethod
+    def _changed(cls) -> str:
+        """ Compare the files with what this process has read of them:
+            None if unchanged, "journal" if records were appended,
+            "reload" if the snapshot was rewritten
+        """
+        s_class = cls.__name__
+        state = SYNC_STATE.get(s_class)
+        try:
+            journal_size = os.stat(".db_{}.journal".format(s_class)).st_size
+        except OSError:
+            journal_size = 0
+        if state is None or journal_size < state[1] or state[0] != \
+                cls._snapshot_identity(cls._snapshot_path()):
+            return 'reload'
+        if journal_size > state[1]:
+            return 'journal'
+        return None
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
+            The snapshot is written to a temporary file of its own, which
+            replaces the file atomically; it supersedes the journal,
+            which is truncated
+        """
+        if cls.BACKEND in BACKENDS:
+            return
+        s_class = cls.__name__
+        file_path = cls._snapshot_path()
+        serializer = SERIALIZERS[cls.SNAPSHOT_FORMAT]
+        if serializer.binary:
+            cls._materialize_all()
+
+        mapped = getattr(serializer, 'mapped', False)
+        # a shared snapshot replaces the objects in memory: no write
+        # may come in between
+        with cls._file_lock(True), cls._persist_lock(), \
+                cls._store_lock() if mapped else nullcontext():
+            with cls._store_lock(), LAZY_LOCK:
+                objs = list(DATA[s_class].values())
+                lazy = list(LAZY.get(s_class, {}).items())
+            # a file of its own, in the directory of the snapshot so that
+            # the rename stays atomic
+            fd, tmp_path = tempfile.mkstemp(
+                prefix=path.basename(file_path) + ".",
+                suffix=".tmp", dir=path.dirname(file_path) or ".")
+            try:
+                os.fchmod(fd, 0o644)
+                with os.fdopen(fd, 'wb' if serializer.binary else 'w') as f:
+                    if mapped:
+                        serializer.dump(cls, objs, f, SHARED.get(s_class),
+                                        SHARED_REMOVED.get(s_class, ()))
+                    elif not lazy:
+                        serializer.dump(cls, objs, f)
+                    else:
+                        cls._dump_with_lazy(f, objs, lazy)
+                os.replace(tmp_path, file_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            if mapped:
+                # the objects in memory are in the new snapshot now
+                with open(file_path, 'rb') as f:
+                    SHARED[s_class] = SharedSnapshot(f)
+                SHARED_REMOVED[s_class] = set()
+                DATA[s_class] = {}
+                for index in cls._every_index():
+                    index.clear()
+                SORTED_IDS.pop(s_class, None)
+
+            journal_path = ".db_{}.journal".format(s_class)
+            if path.exists(journal_path):
+                open(journal_path, 'w').close()
+            JOURNAL_COUNTS[s_class] = 0
+            SYNC_STATE[s_class] = (cls._snapshot_identity(file_path), 0)
+
+    @classmethod
+    def _dump_with_lazy(cls, f, objs: list, lazy: list):
+        """ Write a JSON snapshot, copying the objects still lazy
+            straight from the mapped file instead of building them
         """
+        data = LAZY_FILES[cls.__name__]
+        members = ["{}: {}".format(json.dumps(obj.id),
+                                   json.dumps(obj.to_json(True)))
+                   for obj in objs]
+        members.extend("{}: {}".format(json.dumps(obj_id),
+                                       data[start:end].decode())
+                       for obj_id, (start, end) in lazy)
+        f.write("{" + ", ".join(members) + "}")
+
+    @classmethod
+    def _persist(cls, *records: dict):
+        """ Persist writes now, or hand them to the write-behind
+            flusher depending on DURABILITY
+            In multi-process mode, writes are always persisted now
+        """
+        if cls.DURABILITY == 'sync' or cls._multi_process():
+            cls._write(list(records))
+        else:
+            WRITE_BEHIND.submit(cls, list(records),
+                                wait=cls.DURABILITY == 'group')
+
+    @classmethod
+    def _write(cls, records: List[dict]):
+        """ Persist a batch of writes: append them to the journal,
+            or rewrite the snapshot once in snapshot mode
+            In multi-process mode, the writes of other processes are
+            applied first and the journal is always used
+        """
+        if cls.PERSISTENCE != 'journal' and not cls._multi_process():
+            cls.save_to_file()
+            return
+
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        journal_path = ".db_{}.journal".format(s_class)
+        with cls._file_lock(True), cls._persist_lock():
+            cls._sync(records)
+            with open(journal_path, 'a') as f:
+                f.write("".join(json.dumps(r) + "\n" for r in records))
+                offset = f.tell()
+            if cls._multi_process():
+                SYNC_STATE[s_class] = (SYNC_STATE[s_class][0], offset)
+            JOURNAL_COUNTS[s_class] = \
+                JOURNAL_COUNTS.get(s_class, 0) + len(records)
+            if JOURNAL_COUNTS[s_class] >= cls.JOURNAL_COMPACT_EVERY:
+                cls.save_to_file()
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def flush(cls):
+        """ Persist the writes still pending in the write-behind
+            flusher, for every class
+        """
+        WRITE_BEHIND.flush()
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        object.__setattr__(self, '_json_cache', None)
+        backend = BACKENDS.get(self.BACKEND)
+        if backend is not None:
+            backend.save(self.__class__, [self])
+            return
+        self.__class__._sync()
+        self.__class__._store(self)
+        self.__class__._persist({'op': 'save', 'obj': self.to_json(True)})
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        backend = BACKENDS.get(self.BACKEND)
+        if backend is not None:
+            backend.remove(self.__class__, [self.id])
+            return
+        self.__class__._sync()
+        if self.__class__._discard(self.id):
+            self.__class__._persist({'op': 'remove', 'id': self.id})
+
+    def validate(self):
+        """ Raise ValueError if the object cannot be stored
+        """
+
+    @classmethod
+    def bulk_create(cls, items: Iterable[dict]) -> List[TypeVar('Base')]:
+        """ Create and save many objects, persisting them once
+            Each dict gives the constructor arguments; keys that are
+            not FIELDS (like a User password) are set as attributes.
+            Nothing is stored if any item is invalid (ValueError).
+        """
+        s_class = cls.__name__
+        objs = []
+        ids = set()
+        now = datetime.utcnow()
+        for item in items:
+            if not isinstance(item, dict):
+                raise ValueError("item {} is not a dict".format(len(objs)))
+            obj = cls(**item)
+            for key, value in item.items():
+                if key not in cls.FIELDS:
+                    try:
+                        setattr(obj, key, value)
+                    except AttributeError:
+                        raise ValueError("unknown attribute: {}".format(key))
+            obj.validate()
+            if obj.id in ids or cls.get(obj.id) is not None:
+                raise ValueError("duplicate id: {}".format(obj.id))
+            ids.add(obj.id)
+            obj.updated_at = now
+            objs.append(obj)
+
+        backend = BACKENDS.get(cls.BACKEND)
+        if backend is not None:
+            backend.save(cls, objs, replace=False)
+            return objs
+        cls._sync()
+        # checked again and stored in one turn: no other writer can
+        # take an ID in between
+        with cls._store_lock():
+            for obj in objs:
+                if cls._stored(obj.id) is not None or \
+                        cls._shared_get(obj.id) is not None:
+                    raise ValueError("duplicate id: {}".format(obj.id))
+            if len(objs) > MERGE_INSORT_MAX:
+                # sorting the IDs again beats one insert per object
+                SORTED_IDS.pop(s_class, None)
+            for obj in objs:
+                cls._store(obj)
+        if objs:
+            cls._persist(*({'op': 'save', 'obj': obj.to_json(True)}
+                           for obj in objs))
+        return objs
+
+    @classmethod
+    def bulk_remove(cls, ids: Iterable[str]) -> int:
+        """ Remove many objects by ID, persisting once
+            Return the number of objects removed
+        """
+        backend = BACKENDS.get(cls.BACKEND)
+        if backend is not None:
+            return backend.remove(cls, ids)
+        cls._sync()
+        ids = list(ids)
+        with cls._store_lock():
+            if len(ids) > MERGE_INSORT_MAX:
+                SORTED_IDS.pop(cls.__name__, None)
+            removed = [obj_id for obj_id in ids if cls._discard(obj_id)]
+        if removed:
+            cls._persist(*({'op': 'remove', 'id': obj_id}
+                           for obj_id in removed))
+        return len(removed)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
+        backend = BACKENDS.get(cls.BACKEND)
+        if backend is not None:
+            return backend.count(cls)
+        cls._sync()
         s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        count = len(DATA[s_class].keys()) + len(LAZY.get(s_class, ()))
+        shared = SHARED.get(s_class)
+        if shared is not None:
+            count += len(shared) - len(SHARED_REMOVED[s_class])
+            count -= sum(1 for obj_id in list(DATA[s_class])
+                         if shared.get(obj_id) is not None)
+        return count
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
-        """ Return all objects
+        """ Return all objects, iterated lazily as of the first one:
+            later writes do not show, nor are they blocked
         """
-        return cls.search()
+        s_class = cls.__name__
+        if cls.BACKEND in BACKENDS or SHARED.get(s_class) is not None:
+            return iter(cls.search())
+        cls._sync()
+        cls._materialize_all()
+        return cls._generation()
+
+    @classmethod
+    def page(cls, after: str = None,
+             limit: int = None) -> List[TypeVar('Base')]:
+        """ Return up to limit objects in ID order, starting after the
+            ID `after`: the last ID of a page is the cursor of the next
+        """
+        backend = BACKENDS.get(cls.BACKEND)
+        if backend is not None:
+            return backend.page(cls, after, limit)
+        cls._sync()
+        if SHARED.get(cls.__name__) is not None:
+            return cls._shared_page(cls._ids_after(after), after, limit)
+        result = []
+        while limit is None or len(result) < limit:
+            ids = cls._ids_after(after, None if limit is None
+                                 else limit - len(result))
+            if not ids:
+                break
+            for obj_id in ids:
+                obj = cls.get(obj_id)
+                if obj is not None:
+                    result.append(obj)
+            # the next IDs are looked up again: writes may have
+            # moved them meanwhile
+            after = ids[-1]
+        return result
+
+    @classmethod
+    def _ids_after(cls, after: str = None, count: int = None) -> List[str]:
+        """ Return up to count IDs in memory or still lazy, in order,
+            after the ID `after`
+        """
+        s_class = cls.__name__
+        with cls._store_lock():
+            ids = SORTED_IDS.get(s_class)
+            if ids is None:
+                with LAZY_LOCK:
+                    ids = sorted(set(DATA[s_class]) |
+                                 set(LAZY.get(s_class, ())))
+                SORTED_IDS[s_class] = ids
+            position = 0 if after is None else bisect_right(ids, after)
+            return ids[position:None if count is None
+                       else position + count]
+
+    @classmethod
+    def _shared_page(cls, ids: List[str], after: str,
+                     limit: int) -> List[TypeVar('Base')]:
+        """ page() over the shared snapshot merged with the IDs of the
+            objects in memory
+        """
+        s_class = cls.__name__
+        shared = SHARED[s_class]
+        records = shared.scan(0 if after is None else shared.bisect(after))
+        # objects in memory come first among equal IDs: they replace
+        # the records
+        entries = heapq.merge(((obj_id, None) for obj_id in ids),
+                              ((obj_json['id'], obj_json)
+                               for obj_json in records),
+                              key=lambda entry: entry[0])
+        result = []
+        previous = None
+        for obj_id, obj_json in entries:
+            if limit is not None and len(result) >= limit:
+                break
+            if obj_id == previous:
+                continue
+            previous = obj_id
+            if obj_json is None:
+                obj = DATA[s_class].get(obj_id)
+            elif obj_id in SHARED_REMOVED[s_class]:
+                obj = None
+            else:
+                obj = cls(**obj_json)
+            if obj is not None:
+                result.append(obj)
+        return result
 
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
+        backend = BACKENDS.get(cls.BACKEND)
+        if backend is not None:
+            return backend.get(cls, id)
+        cls._sync()
         s_class = cls.__name__
-        return DATA[s_class].get(id)
+        obj = DATA[s_class].get(id)
+        if obj is None:
+            obj = cls._materialize(id)
+        if obj is None:
+            obj = cls._shared_get(id)
+        return obj
 
     @classmethod
-    def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
+    def search(cls, attributes: dict = {}, order_by: str = None,
+               reverse: bool = False,
+               limit: int = None) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+            A value may be a Condition (Range, Prefix, Suffix, Contains)
+            instead of the value to be equal to. Results are ordered by
+            the attribute order_by, if any, and cut to limit.
+            Uses a hash index for an equality, a sorted or trigram index
+            for a condition, a sorted index for order_by, or the backend
+            to narrow the candidates down; the shared snapshot is
+            searched through its own indexes
         """
         s_class = cls.__name__
         def _search(obj):
             if len(attributes) == 0:
                 return True
             for k, v in attributes.items():
-                if (getattr(obj, k) != v):
+                if isinstance(v, Condition):
+                    if not v.match(getattr(obj, k)):
+                        return False
+                elif (getattr(obj, k) != v):
                     return False
             return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+
+        backend = BACKENDS.get(cls.BACKEND)
+        if backend is not None:
+            return cls._order(filter(_search, backend.search(
+                cls, attributes, order_by, reverse, limit)),
+                order_by, reverse, limit)
+        cls._sync()
+
+        candidates = None
+        ordered = False
+        indexes = cls._indexes()
+        for k, v in attributes.items():
+            if isinstance(v, Contains):
+                text_index = cls._text_index(k)
+                if text_index is not None:
+                    candidates = text_index.select(v)
+            elif isinstance(v, Condition):
+                sorted_index = cls._sorted_index(k)
+                if sorted_index is not None:
+                    candidates = sorted_index.select(v, reverse)
+                    # suffixes come in the order of the reversed values
+                    ordered = k == order_by and candidates is not None \
+                        and not isinstance(v, Suffix)
+            elif k in indexes:
+                candidates = indexes[k].lookup(v)
+            if candidates is not None:
+                break
+        if candidates is None and order_by is not None:
+            sorted_index = cls._sorted_index(order_by)
+            if sorted_index is not None:
+                candidates = sorted_index.ordered(reverse)
+                ordered = True
+        if candidates is None:
+            cls._materialize_all()
+            candidates = cls._generation()
+        if SHARED.get(s_class) is not None:
+            candidates = chain(list(candidates),
+                               cls._shared_search(attributes))
+            ordered = False
+        if ordered:
+            # in order already: stop at limit
+            return list(islice(filter(_search, candidates), limit))
+        return cls._order(filter(_search, candidates), order_by, reverse,
+                          limit)
+
+    @classmethod
+    def search_text(cls, q: str,
+                    limit: int = None) -> List[TypeVar('Base')]:
+        """ Search the objects with q in any of TEXT_ATTRIBUTES,
+            ignoring case, the matches of the first attributes first
+        """
+        condition = Contains(q)
+        result = {}
+        for attribute in cls.TEXT_ATTRIBUTES:
+            if limit is not None and len(result) >= limit:
+                break
+            # at most len(result) of these are found already
+            for obj in cls.search({attribute: condition}, limit=limit):
+                result.setdefault(obj.id, obj)
+        return list(result.values())[:limit]
+
+    @staticmethod
+    def _order(objs: Iterable[TypeVar('Base')], order_by: str,
+               reverse: bool, limit: int) -> List[TypeVar('Base')]:
+        """ Return objects sorted by an attribute, values without an
+            order last, cut to limit (without sorting, stop there)
+        """
+        if order_by is None:
+            return list(islice(objs, limit))
+        objs = sorted(objs, key=lambda obj: sort_key(getattr(obj, order_by,
+                                                             None)) or (3,),
+                      reverse=reverse)
+        return objs if limit is None else objs[:limit]
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+""" Snapshot serializers of the Base file store
+"""
+import heapq
+import json
+import pickle
+from array import array
+from typing import IO, Iterable, Iterator, List, TypeVar
+from models.shared_snapshot import (MAGIC, RECORD, SLOT, TRAILER,
+                                    SharedSnapshot, key_hash)
+
+
+# Where the Base timestamps live in memory: integer seconds since EPOCH
+TIMESTAMP_SLOTS = {'created_at': '_created_ts', 'updated_at': '_updated_ts'}
+
+
+class JSONSerializer():
+    """ .db_<Class>.json: {id: obj.to_json(True)}
+    """
+
+    extension = 'json'
+    binary = False
+
+    @staticmethod
+    def dump(cls: type, objs: List[TypeVar('Base')], f: IO):
+        """ Write objects to a text file
+        """
+        json.dump({obj.id: obj.to_json(True) for obj in objs}, f)
+
+    @staticmethod
+    def load(cls: type, f: IO) -> Iterator[TypeVar('Base')]:
+        """ Read objects from a text file
+        """
+        for obj_json in json.load(f).values():
+            yield cls(**obj_json)
+
+
+class _Unpickler(pickle.Unpickler):
+    """ Unpickler limited to builtin containers and scalars
+    """
+
+    def find_class(self, module: str, name: str):
+        """ No global may be loaded from a snapshot
+        """
+        raise pickle.UnpicklingError(
+            "global '{}.{}' is forbidden".format(module, name))
+
+
+class BinarySerializer():
+    """ .db_<Class>.bin: a column per attribute, timestamps kept as
+        integer seconds, pickled with builtin types only
+
+        Objects are rebuilt by setting their attributes directly, so no
+        timestamp is parsed and no constructor runs on load.
+    """
+
+    extension = 'bin'
+    binary = True
+    MAGIC = b'BASEBIN1'
+
+    @staticmethod
+    def dump(cls: type, objs: List[TypeVar('Base')], f: IO):
+        """ Write objects to a binary file
+        """
+        extras = sorted({key for obj in objs
+                         for key in getattr(obj, '__dict__', ())})
+        columns = list(cls.FIELDS) + extras
+        data = [[getattr(obj, TIMESTAMP_SLOTS.get(column, column), None)
+                 for obj in objs] for column in columns]
+        f.write(BinarySerializer.MAGIC)
+        pickle.dump((columns, data), f, protocol=4)
+
+    @staticmethod
+    def load(cls: type, f: IO) -> Iterator[TypeVar('Base')]:
+        """ Read objects from a binary file
+        """
+        if f.read(len(BinarySerializer.MAGIC)) != BinarySerializer.MAGIC:
+            raise ValueError("not a Base binary snapshot")
+        columns, data = _Unpickler(f).load()
+
+        slots = set()
+        for klass in cls.__mro__:
+            slots.update(getattr(klass, '__slots__', ()))
+        has_dict = cls.__dictoffset__ != 0
+        names = [TIMESTAMP_SLOTS.get(column, column) for column in columns]
+        keep = [i for i, name in enumerate(names)
+                if name in slots or has_dict]
+
+        set_attribute = object.__setattr__
+        for row in zip(*data):
+            obj = cls.__new__(cls)
+            for i in keep:
+                set_attribute(obj, names[i], row[i])
+            yield obj
+
+
+class SharedSerializer():
+    """ .db_<Class>.shared: records indexed by ID and INDEXED_ATTRIBUTES,
+        read in place by SharedSnapshot instead of being loaded
+
+        A new snapshot is written from the objects in memory and the
+        records of the current one they do not replace.
+    """
+
+    extension = 'shared'
+    binary = True
+    mapped = True
+
+    @staticmethod
+    def dump(cls: type, objs: List[TypeVar('Base')], f: IO,
+             snapshot: SharedSnapshot = None, removed: Iterable = ()):
+        """ Write objects, and the records of snapshot not replaced by
+            objs nor listed in removed, to a binary file
+        """
+        objs = sorted(objs, key=lambda obj: obj.id)
+        entries = [((obj.id, None, obj.to_json(True)) for obj in objs)]
+        if snapshot is not None:
+            entries.append((obj_json['id'], snapshot.raw(number), obj_json)
+                           for number, obj_json in
+                           enumerate(snapshot.scan()))
+        removed = set(removed)
+
+        attributes = ('id',) + tuple(cls.INDEXED_ATTRIBUTES)
+        offsets = array('Q')
+        lengths = array('I')
+        hashes = {attribute: array('I') for attribute in attributes}
+        position = len(MAGIC)
+        previous = None
+        f.write(MAGIC)
+        # objs come first among equal IDs: they replace the records
+        for obj_id, raw, obj_json in heapq.merge(*entries,
+                                                 key=lambda e: e[0]):
+            if obj_id == previous or obj_id in removed:
+                continue
+            previous = obj_id
+            if raw is None:
+                raw = json.dumps(obj_json).encode()
+            f.write(raw)
+            offsets.append(position)
+            lengths.append(len(raw))
+            position += len(raw)
+            for attribute, values in hashes.items():
+                value_hash = key_hash(obj_json.get(attribute))
+                values.append(value_hash if value_hash is not None else 0)
+
+        count = len(offsets)
+        records = position
+        table = bytearray(RECORD.size * count)
+        for number in range(count):
+            RECORD.pack_into(table, RECORD.size * number,
+                             offsets[number], lengths[number])
+        f.write(table)
+        position += len(table)
+
+        slots = 1
+        while slots <= count * 2:
+            slots *= 2
+        indexes = {}
+        for attribute, values in hashes.items():
+            table = bytearray(SLOT.size * slots)
+            for number, value_hash in enumerate(values):
+                slot = value_hash & (slots - 1)
+                while SLOT.unpack_from(table, SLOT.size * slot)[0]:
+                    slot = (slot + 1) & (slots - 1)
+                SLOT.pack_into(table, SLOT.size * slot, number + 1,
+                               value_hash)
+            f.write(table)
+            indexes[attribute] = [position, slots]
+            position += len(table)
+
+        meta = json.dumps({
+            'generation': snapshot.generation + 1 if snapshot else 1,
+            'count': count, 'records': records, 'indexes': indexes
+        }).encode()
+        f.write(meta)
+        f.write(TRAILER.pack(len(meta), MAGIC))
+
+    @staticmethod
+    def load(cls: type, f: IO) -> Iterator[TypeVar('Base')]:
+        """ Read every object from a binary file
+        """
+        for obj_json in SharedSnapshot(f).scan():
+            yield cls(**obj_json)
+
+
+SERIALIZERS = {'json': JSONSerializer, 'binary': BinarySerializer,
+               'shared': SharedSerializer}
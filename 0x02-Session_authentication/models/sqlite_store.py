@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+""" SQLite store module
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, List, TypeVar
+from models.index import successor
+from models.query import Contains, Prefix, Range
+from models.serializers import TIMESTAMP_SLOTS
+
+
+# Values stored as such in their column; others (lists, dicts, booleans)
+# are kept as JSON in the `_extra` column, with the attributes that
+# have no slot
+SCALAR_TYPES = (str, int, float, type(None))
+# Timestamp columns hold integer seconds since EPOCH
+EPOCH = datetime(1970, 1, 1)
+ONE_SECOND = timedelta(seconds=1)
+# SQL types of the values a Range of a bound type may hold
+RANGE_TYPES = {int: "'integer', 'real'", float: "'integer', 'real'",
+               str: "'text'"}
+
+
+def quote(name: str) -> str:
+    """ Quote an SQL identifier
+    """
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def timestamp_bound(bound: datetime, include: bool, low: bool) -> tuple:
+    """ Return the (seconds, include) bound of a timestamp column
+        selecting the times to the second within a datetime bound
+    """
+    seconds, rest = divmod(bound - EPOCH, ONE_SECOND)
+    if rest:
+        # between two seconds: the earlier one is out of a low bound
+        # and in a high one
+        return seconds, not low
+    return seconds, include
+
+
+class SQLiteStore():
+    """ Backend of the Base API in an embedded SQLite database
+
+        Each class has a table with one column per FIELDS entry (the
+        timestamps as integer seconds) and an index per
+        INDEXED_ATTRIBUTES entry. Every write is a transaction of its
+        own, so several processes can share one database file.
+    """
+
+    def __init__(self, file_path: str):
+        """ Initialize a store on file_path, opened on first use
+        """
+        self.file_path = file_path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.tables = set()
+
+    def _connection(self, cls: type) -> sqlite3.Connection:
+        """ Return the connection of the current thread and process,
+            with the table of cls created
+        """
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != os.getpid():
+            conn = sqlite3.connect(self.file_path, timeout=30)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = {}".format(
+                "FULL" if cls.DURABILITY == 'sync' else "NORMAL"))
+            self.local.conn = conn
+            self.local.pid = os.getpid()
+        if cls.__name__ not in self.tables:
+            with self.lock:
+                self._create_table(conn, cls)
+                self.tables.add(cls.__name__)
+        return conn
+
+    @staticmethod
+    def _create_table(conn: sqlite3.Connection, cls: type):
+        """ Create the table and indexes of cls, adding the columns
+            of FIELDS missing from an existing table
+        """
+        table = quote(cls.__name__)
+        columns = ["{} PRIMARY KEY".format(quote('id'))]
+        columns.extend(quote(f) for f in cls.FIELDS if f != 'id')
+        columns.append(quote('_extra'))
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS {} ({})".format(
+                table, ", ".join(columns)))
+            existing = {row[1] for row in
+                        conn.execute("PRAGMA table_info({})".format(table))}
+            for field in cls.FIELDS:
+                if field not in existing:
+                    conn.execute("ALTER TABLE {} ADD COLUMN {}".format(
+                        table, quote(field)))
+            for attribute in set(cls.INDEXED_ATTRIBUTES +
+                                 cls.SORTED_ATTRIBUTES):
+                conn.execute("CREATE INDEX IF NOT EXISTS {} ON {} ({})"
+                             .format(quote("{}_{}".format(cls.__name__,
+                                                          attribute)),
+                                     table, quote(attribute)))
+
+    @staticmethod
+    def _row(cls: type, obj: TypeVar('Base')) -> list:
+        """ Return the column values of an object
+        """
+        row = []
+        extra = dict(getattr(obj, '__dict__', {}))
+        for field in cls.FIELDS:
+            value = getattr(obj, TIMESTAMP_SLOTS.get(field, field), None)
+            if type(value) not in SCALAR_TYPES:
+                extra[field] = value
+                value = None
+            row.append(value)
+        row.append(json.dumps(extra) if extra else None)
+        return row
+
+    @staticmethod
+    def _object(cls: type, columns: List[str],
+                row: tuple) -> TypeVar('Base'):
+        """ Build an object from a row, without running its constructor
+        """
+        obj = cls.__new__(cls)
+        set_attribute = object.__setattr__
+        for column, value in zip(columns, row):
+            if column == '_extra':
+                for key, extra in json.loads(value or '{}').items():
+                    set_attribute(obj, TIMESTAMP_SLOTS.get(key, key), extra)
+            elif column in cls.FIELDS:
+                set_attribute(obj, TIMESTAMP_SLOTS.get(column, column), value)
+        return obj
+
+    def _select(self, cls: type, where: str = "",
+                params: Iterable = ()) -> List[TypeVar('Base')]:
+        """ Return the objects of the rows matching an SQL condition
+        """
+        cursor = self._connection(cls).execute(
+            "SELECT * FROM {} {}".format(quote(cls.__name__), where),
+            tuple(params))
+        columns = [description[0] for description in cursor.description]
+        return [self._object(cls, columns, row) for row in cursor]
+
+    def load(self, cls: type):
+        """ Open the database and create the table of cls
+        """
+        self._connection(cls)
+
+    def get(self, cls: type, obj_id: str) -> TypeVar('Base'):
+        """ Return one object by ID, or None
+        """
+        objs = self._select(cls, "WHERE {} = ?".format(quote('id')),
+                            (obj_id,))
+        return objs[0] if objs else None
+
+    def search(self, cls: type, attributes: dict, order_by: str = None,
+               reverse: bool = False,
+               limit: int = None) -> List[TypeVar('Base')]:
+        """ Return the objects that may match attributes: the columns
+            with a scalar value, a prefix, a substring or a range of
+            scalars (datetimes for the timestamps) are matched in SQL,
+            the caller checks the others
+            When SQL matches every condition exactly, the rows are also
+            ordered by order_by and cut to limit there
+        """
+        conditions = []
+        params = []
+        exact = True
+        for key, value in attributes.items():
+            if key not in cls.FIELDS:
+                exact = False
+                continue
+            column = quote(key)
+            if key in TIMESTAMP_SLOTS:
+                exact = self._timestamp_range(column, value, conditions,
+                                              params) and exact
+            elif type(value) in SCALAR_TYPES:
+                # a value kept in _extra leaves its column NULL too
+                exact = exact and value is not None
+                conditions.append("{} IS ?".format(column))
+                params.append(value)
+            elif isinstance(value, Prefix):
+                conditions.append("{} >= ?".format(column))
+                params.append(value.prefix)
+                end = successor(value.prefix)
+                if end is not None:
+                    conditions.append("{} < ?".format(column))
+                    params.append(end)
+            elif isinstance(value, Contains) and value.substring.isascii():
+                # LIKE ignores the case of ASCII letters only: the
+                # caller checks the others
+                exact = False
+                conditions.append("{} LIKE ? ESCAPE '\\'".format(column))
+                params.append("%{}%".format(re.sub(r'([\\%_])', r'\\\1',
+                                                   value.substring)))
+            elif isinstance(value, Range) and \
+                    self._range_type(value) is not None:
+                # a range only holds values of the type of its bounds
+                conditions.append("typeof({}) IN ({})".format(
+                    column, self._range_type(value)))
+                for bound, include, operator in (
+                        (value.low, value.include_low, ">"),
+                        (value.high, value.include_high, "<")):
+                    if bound is not None:
+                        conditions.append("{} {}{} ?".format(
+                            column, operator, "=" if include else ""))
+                        params.append(bound)
+            else:
+                exact = False
+        where = "WHERE " + " AND ".join(conditions) if conditions else ""
+        if exact and order_by in cls.FIELDS:
+            # values kept in _extra have no order: last, as in Base
+            where += " ORDER BY {0} IS NULL AND json_type({1}, ?) " \
+                "IS NOT NULL{2}, {0}{2}".format(quote(order_by),
+                                                quote('_extra'),
+                                                " DESC" if reverse else "")
+            params.append('$.{}'.format(quote(order_by)))
+        if exact and limit is not None and \
+                (order_by is None or order_by in cls.FIELDS):
+            where += " LIMIT ?"
+            params.append(limit)
+        return self._select(cls, where, params)
+
+    @staticmethod
+    def _range_type(value: Range) -> str:
+        """ Return the SQL types of the values in a range of scalars,
+            or None if its bounds are not scalars of one kind
+        """
+        types = {RANGE_TYPES.get(type(bound)) for bound in
+                 (value.low, value.high) if bound is not None}
+        return types.pop() if len(types) == 1 else None
+
+    @staticmethod
+    def _timestamp_range(column: str, value, conditions: list,
+                         params: list) -> bool:
+        """ Add the SQL conditions of a Range of datetimes on a timestamp
+            column; return False if the value is not one
+        """
+        bounds = [bound for bound in (value.low, value.high)
+                  if bound is not None] if isinstance(value, Range) else []
+        if not bounds or any(type(bound) is not datetime or
+                             bound.tzinfo is not None for bound in bounds):
+            return False
+        for bound, include, operator, low in (
+                (value.low, value.include_low, ">", True),
+                (value.high, value.include_high, "<", False)):
+            if bound is not None:
+                seconds, include = timestamp_bound(bound, include, low)
+                conditions.append("{} {}{} ?".format(
+                    column, operator, "=" if include else ""))
+                params.append(seconds)
+        return True
+
+    def page(self, cls: type, after: str = None,
+             limit: int = None) -> List[TypeVar('Base')]:
+        """ Return up to limit objects in ID order, after the ID `after`
+        """
+        where = "" if after is None else \
+            "WHERE {} > ?".format(quote('id'))
+        params = () if after is None else (after,)
+        return self._select(cls, "{} ORDER BY {} LIMIT ?".format(
+            where, quote('id')), params + (-1 if limit is None else limit,))
+
+    def count(self, cls: type) -> int:
+        """ Count the objects of cls
+        """
+        return self._connection(cls).execute(
+            "SELECT COUNT(*) FROM {}".format(quote(cls.__name__))
+        ).fetchone()[0]
+
+    def save(self, cls: type, objs: List[TypeVar('Base')],
+             replace: bool = True):
+        """ Write objects in one transaction; unless replace, an
+            existing ID fails the whole write with ValueError
+        """
+        conn = self._connection(cls)
+        columns = list(cls.FIELDS) + ['_extra']
+        statement = "INSERT {}INTO {} ({}) VALUES ({})".format(
+            "OR REPLACE " if replace else "", quote(cls.__name__),
+            ", ".join(quote(column) for column in columns),
+            ", ".join("?" * len(columns)))
+        try:
+            with conn:
+                conn.executemany(statement,
+                                 (self._row(cls, obj) for obj in objs))
+        except sqlite3.IntegrityError as e:
+            raise ValueError("duplicate id: {}".format(e))
+
+    def remove(self, cls: type, ids: Iterable[str]) -> int:
+        """ Delete objects by ID in one transaction
+            Return the number of objects removed
+        """
+        conn = self._connection(cls)
+        statement = "DELETE FROM {} WHERE {} = ?".format(
+            quote(cls.__name__), quote('id'))
+        removed = 0
+        with conn:
+            for obj_id in ids:
+                removed += conn.execute(statement, (obj_id,)).rowcount
+        return removed
@@ -9,6 +9,13 @@ class User(Base):
     """ User class
     """
 
+    __slots__ = ('email', '_password', 'first_name', 'last_name')
+    FIELDS = Base.FIELDS + __slots__
+    INDEXED_ATTRIBUTES = ('email',)
+    SORTED_ATTRIBUTES = ('email', 'created_at', 'updated_at')
+    SUFFIX_ATTRIBUTES = ('email',)
+    TEXT_ATTRIBUTES = ('email', 'first_name', 'last_name')
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
         """
@@ -43,6 +50,12 @@ class User(Base):
         pwd_e = pwd.encode()
         return hashlib.sha256(pwd_e).hexdigest().lower() == self.password
 
+    def validate(self):
+        """ A User needs an email
+        """
+        if not self.email or type(self.email) is not str:
+            raise ValueError("email missing")
+
     def display_name(self) -> str:
         """ Display User name based on email/first_name/last_name
         """
@@ -8,6 +8,10 @@ class UserSession(Base):
     """User Session class that inherits from Base.
     """
 
+    __slots__ = ('user_id', 'session_id')
+    FIELDS = Base.FIELDS + __slots__
+    INDEXED_ATTRIBUTES = ('session_id',)
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a UserSession instance.
         """
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+""" Write-behind module
+"""
+import atexit
+import threading
+import time
+
+
+# Attempts at persisting a batch before its writes are dropped from the
+# queue (they stay in memory)
+FLUSH_MAX_ATTEMPTS = 3
+
+
+class WriteBehind():
+    """ Background flusher batching the writes of the Base store
+
+        Writes are queued per class and persisted by one thread,
+        at most every FLUSH_INTERVAL_MS or once FLUSH_MAX_CHANGES
+        writes are pending. Group-commit writers wait for the flush
+        that includes their write; the flusher starts it right away,
+        so concurrent writers share one disk write. A failed flush
+        raises its error in the writers waiting for it and is retried
+        up to FLUSH_MAX_ATTEMPTS times in all.
+    """
+
+    def __init__(self):
+        """ Initialize an idle flusher
+        """
+        self.cond = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.pending = {}
+        self.changes = 0
+        self.enqueued = 0
+        self.flushed = 0
+        # last ticket of the last failed flush, and its error
+        self.failed = (0, None)
+        self.attempts = 0
+        self.urgent = False
+        self.interval = 0.1
+        self.max_changes = 1000
+        self.thread = None
+
+    def submit(self, cls: type, records: list, wait: bool = False):
+        """ Queue writes of `cls`; with wait, return once they are
+            persisted
+        """
+        with self.cond:
+            entry = self.pending.setdefault(cls.__name__, (cls, []))
+            entry[1].extend(records)
+            self.changes += len(records)
+            self.enqueued += 1
+            ticket = self.enqueued
+            self.interval = cls.FLUSH_INTERVAL_MS / 1000
+            self.max_changes = cls.FLUSH_MAX_CHANGES
+            self.urgent = self.urgent or wait
+            self._start()
+            self.cond.notify_all()
+            while wait and self.flushed < ticket:
+                if self.failed[0] >= ticket:
+                    raise self.failed[1]
+                self.cond.wait()
+
+    def flush(self):
+        """ Persist every pending write now
+        """
+        with self.write_lock:
+            with self.cond:
+                batch, self.pending = self.pending, {}
+                upto = self.enqueued
+                self.changes = 0
+                self.urgent = False
+            try:
+                for s_class, (cls, records) in list(batch.items()):
+                    cls._write(records)
+                    del batch[s_class]
+            except Exception as e:
+                with self.cond:
+                    self.failed = (upto, e)
+                    self.attempts += 1
+                    if self.attempts < FLUSH_MAX_ATTEMPTS:
+                        self._requeue(batch)
+                    else:
+                        self.attempts = 0
+                    self.cond.notify_all()
+                raise
+            with self.cond:
+                self.flushed = max(self.flushed, upto)
+                self.attempts = 0
+                self.cond.notify_all()
+
+    def _requeue(self, batch: dict):
+        """ Put the writes of a failed flush back in front
+        """
+        for s_class, (cls, records) in batch.items():
+            newer = self.pending.get(s_class, (cls, []))[1]
+            self.pending[s_class] = (cls, records + newer)
+            self.changes += len(records)
+
+    def _start(self):
+        """ Start the flusher thread on first use
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run,
+                                           name="base-write-behind",
+                                           daemon=True)
+            self.thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        """ Flush whenever a trigger is reached
+        """
+        while True:
+            with self.cond:
+                deadline = None
+                while True:
+                    if self.pending:
+                        if self.urgent or self.changes >= self.max_changes:
+                            break
+                        if deadline is None:
+                            deadline = time.monotonic() + self.interval
+                        timeout = deadline - time.monotonic()
+                        if timeout <= 0:
+                            break
+                    else:
+                        deadline = None
+                        timeout = None
+                    self.cond.wait(timeout)
+            try:
+                self.flush()
+            except Exception:
+                time.sleep(self.interval)
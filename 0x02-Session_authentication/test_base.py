@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+""" Tests of the Base store
+"""
+import builtins
+import multiprocessing
+import os
+import threading
+import time
+import pytest
+import models.base
+from models.user import User
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """ Empty User store in a temporary directory
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(User, 'PERSISTENCE', 'journal')
+    User.load_from_file()
+    return tmp_path
+
+
+def save_in_threads(threads: int, saves: int) -> list:
+    """ Save users from concurrent threads, returning the errors raised
+    """
+    errors = []
+
+    def save(number: int):
+        for i in range(saves):
+            try:
+                User(email="user{}_{}@hbtn.io".format(number, i)).save()
+            except Exception as e:
+                errors.append(e)
+
+    workers = [threading.Thread(target=save, args=(number,))
+               for number in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return errors
+
+
+def save_from_process(barrier, number: int, saves: int,
+                      remove_every: int):
+    """ Save users from a worker forked after loading, once every
+        worker is ready, removing one in remove_every right away
+    """
+    barrier.wait()
+    for i in range(saves):
+        user = User(email="worker{}_{}@hbtn.io".format(number, i))
+        user.save()
+        if remove_every and i % remove_every == 0:
+            user.remove()
+
+
+def save_in_processes(processes: int, saves: int,
+                      remove_every: int = 0) -> list:
+    """ Save users from forked workers at once, returning their exit
+        codes
+    """
+    context = multiprocessing.get_context('fork')
+    barrier = context.Barrier(processes)
+    workers = [context.Process(target=save_from_process,
+                               args=(barrier, number, saves, remove_every))
+               for number in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    return [worker.exitcode for worker in workers]
+
+
+def page_ids(limit: int = None) -> list:
+    """ Return the IDs of every page of limit users, in order
+    """
+    ids = []
+    after = None
+    while True:
+        users = User.page(after, limit)
+        ids.extend(user.id for user in users)
+        if limit is None or len(users) < limit:
+            return ids
+        after = users[-1].id
+
+
+def test_page_follows_writes(store):
+    """ Saves and removes, one by one or in bulk, show in the pages
+    """
+    users = User.bulk_create({'email': "user{}@hbtn.io".format(i)}
+                             for i in range(100))
+    assert page_ids(7) == sorted(user.id for user in users)
+    users.append(User(email="one@hbtn.io"))
+    users[-1].save()
+    users.pop(0).remove()
+    User.bulk_remove([user.id for user in users[:80]])
+    users = users[80:]
+    assert page_ids(7) == page_ids() == sorted(user.id for user in users)
+
+
+def test_page_sees_a_save_made_while_sorting(store, monkeypatch):
+    """ A user saved while page() sorts the IDs is not lost from the
+        cached order
+    """
+    for i in range(3):
+        User(email="user{}@hbtn.io".format(i)).save()
+    models.base.SORTED_IDS.pop('User', None)
+    started = threading.Event()
+
+    def slow_sorted(*args, **kwargs):
+        started.set()
+        time.sleep(0.2)
+        return builtins.sorted(*args, **kwargs)
+
+    monkeypatch.setattr(models.base, 'sorted', slow_sorted, raising=False)
+    reader = threading.Thread(target=User.page)
+    reader.start()
+    started.wait()
+    User(email="late@hbtn.io").save()
+    reader.join()
+    monkeypatch.undo()
+    assert User.count() == 4
+    assert len(User.page()) == 4
+
+
+@pytest.mark.parametrize('persistence, compact_every',
+                         [('snapshot', 1000), ('journal', 5)])
+def test_concurrent_saves_are_all_persisted(store, monkeypatch,
+                                            persistence, compact_every):
+    """ Threads saving at once neither fail nor lose a write, however
+        often the journal is compacted
+    """
+    monkeypatch.setattr(User, 'PERSISTENCE', persistence)
+    monkeypatch.setattr(User, 'JOURNAL_COMPACT_EVERY', compact_every)
+    assert save_in_threads(8, 50) == []
+    User.load_from_file()
+    assert User.count() == 400
+
+
+def test_snapshot_writes_use_a_tmp_file_of_their_own(store):
+    """ Left over by a crash, even as a directory, the tmp name of an
+        older version neither blocks a snapshot nor gets reused
+    """
+    os.mkdir(".db_User.json.tmp")
+    User(email="one@hbtn.io").save()
+    User.save_to_file()
+    assert os.path.isdir(".db_User.json.tmp")
+    assert sorted(os.listdir(".")) == [".db_User.journal", ".db_User.json",
+                                       ".db_User.json.tmp"]
+    User.load_from_file()
+    assert [user.email for user in User.all()] == ["one@hbtn.io"]
+
+
+def test_shared_snapshot_workers_lose_no_write(store, monkeypatch):
+    """ Workers forked with a shared snapshot mapped, even without
+        MULTI_PROCESS, each publish their writes without losing the
+        other's
+    """
+    monkeypatch.setattr(User, 'SNAPSHOT_FORMAT', 'shared')
+    monkeypatch.setattr(User, 'JOURNAL_COMPACT_EVERY', 3)
+    User(email="first@hbtn.io").save()
+    User.save_to_file()
+    User.load_from_file()
+    assert save_in_processes(2, 10) == [0, 0]
+    User.load_from_file()
+    assert User.count() == 21
+
+
+def test_multi_process_writers_lose_no_write(store, monkeypatch):
+    """ Workers sharing the files save and remove at once while the
+        journal is compacted, and every write is on disk
+    """
+    monkeypatch.setattr(User, 'MULTI_PROCESS', True)
+    monkeypatch.setattr(User, 'JOURNAL_COMPACT_EVERY', 7)
+    User.load_from_file()
+    assert save_in_processes(4, 30, remove_every=3) == [0] * 4
+    User.load_from_file()
+    assert sorted(user.email for user in User.all()) == sorted(
+        "worker{}_{}@hbtn.io".format(number, i)
+        for number in range(4) for i in range(30) if i % 3)
+
+
+def test_multi_process_migration_locks_exclusively(store, monkeypatch):
+    """ Loading a snapshot to migrate takes the exclusive lock up front
+        instead of upgrading a shared one
+    """
+    monkeypatch.setattr(User, 'MULTI_PROCESS', True)
+    monkeypatch.setattr(User, 'SNAPSHOT_FORMAT', 'binary')
+    User(email="one@hbtn.io").save()
+    User.save_to_file()
+    monkeypatch.setattr(User, 'SNAPSHOT_FORMAT', 'json')
+    User.load_from_file()
+    assert os.path.exists(".db_User.json")
+    assert not os.path.exists(".db_User.bin")
+    assert [user.email for user in User.all()] == ["one@hbtn.io"]
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+""" Tests of the indexes of the Base store
+"""
+import threading
+from datetime import datetime
+import pytest
+from models.index import SortedIndex
+from models.query import Range
+from models.user import User
+
+
+class Item():
+    """ Object with an ID and an indexed value
+    """
+
+    def __init__(self, id: str, value):
+        """ Initialize an item
+        """
+        self.id = id
+        self.value = value
+
+
+def sorted_index(count: int) -> tuple:
+    """ Return a SortedIndex on `value` holding count items, and the
+        items by ID
+    """
+    items = {"{:05}".format(i): Item("{:05}".format(i), i)
+             for i in range(count)}
+    index = SortedIndex('value', items.get, suffixes=True)
+    for item in items.values():
+        index.add(item)
+    return index, items
+
+
+@pytest.mark.parametrize('reverse', [False, True])
+def test_iteration_survives_removals(reverse):
+    """ Removing entries during an iteration neither stalls nor repeats
+        it, and the entries left are all yielded once, in order
+    """
+    index, items = sorted_index(768)
+    seen = []
+    for item in index.ordered(reverse):
+        seen.append(item.id)
+        if len(seen) == 128:
+            # behind and ahead
+            for i in (0, 1, 767, 512):
+                key = "{:05}".format(i)
+                if key not in seen:
+                    index.discard(items.pop(key))
+    assert len(seen) == len(set(seen))
+    assert seen == sorted(seen, reverse=reverse)
+    expected = set(items) | set(seen)
+    assert set(seen) == expected
+
+
+def test_iteration_reads_a_snapshot():
+    """ Entries added during an iteration show in the next one only
+    """
+    index, items = sorted_index(512)
+    seen = []
+    for item in index.range(low=0):
+        seen.append(item.id)
+        if len(seen) == 1:
+            items["zzzzz"] = Item("zzzzz", 2560)
+            index.add(items["zzzzz"])
+    assert seen == sorted(items)[:-1]
+    assert [item.id for item in index.range(low=2560)] == ["zzzzz"]
+
+
+@pytest.mark.parametrize('reverse', [False, True])
+def test_moved_key_is_yielded_once(reverse):
+    """ An object moved to another key during an iteration, ahead or
+        behind, is yielded once, where it was
+    """
+    index, items = sorted_index(10)
+    seen = []
+    for item in index.ordered(reverse):
+        seen.append(item.id)
+        if len(seen) == 1:
+            for key, value in (("00000", 100), ("00009", -1),
+                               ("00005", None)):
+                index.discard(items[key])
+                items[key].value = value
+                index.add(items[key])
+    assert seen == sorted(items, reverse=reverse)
+
+
+def test_ordered_search_while_updating(tmp_path, monkeypatch):
+    """ A search ordered by updated_at returns each user once while
+        the updated_at of users moves back and forth
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(User, 'PERSISTENCE', 'journal')
+    User.load_from_file()
+    users = User.bulk_create({'email': "user{}@hbtn.io".format(i)}
+                             for i in range(600))
+    User.search(order_by='updated_at', limit=1)
+    stop = threading.Event()
+
+    def update():
+        year = 0
+        while not stop.is_set():
+            year += 1
+            for user in users[::20]:
+                user.updated_at = datetime(2000 + year % 50, 1, 1)
+
+    thread = threading.Thread(target=update, daemon=True)
+    thread.start()
+    try:
+        for reverse in (False, True) * 10:
+            found = User.search(order_by='updated_at', reverse=reverse)
+            assert len(found) == len({user.id for user in found}) == 600
+    finally:
+        stop.set()
+        thread.join(10)
+
+
+def test_search_while_removing(tmp_path, monkeypatch):
+    """ A range search keeps finishing while users are removed
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(User, 'PERSISTENCE', 'journal')
+    User.load_from_file()
+    users = User.bulk_create({'email': "user{}@hbtn.io".format(i)}
+                             for i in range(3000))
+    stop = threading.Event()
+    scans = []
+
+    def scan():
+        while not stop.is_set():
+            User.search({'created_at': Range(low=datetime(2000, 1, 1))})
+            scans.append(True)
+
+    thread = threading.Thread(target=scan, daemon=True)
+    thread.start()
+    for user in users[:300]:
+        user.remove()
+    stop.set()
+    thread.join(10)
+    assert not thread.is_alive() and scans
+    assert User.count() == 2700
+
+
+def test_indexes_are_built_on_first_search(tmp_path, monkeypatch):
+    """ Loading builds no sorted or trigram index; the first search
+        that needs one builds it over the lazy objects too
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(User, 'PERSISTENCE', 'journal')
+    User.load_from_file()
+    User.bulk_create({'email': "user{}@hbtn.io".format(i)}
+                     for i in range(50))
+    User.flush()
+    monkeypatch.setattr(User, 'LAZY_LOAD', True)
+    User.load_from_file()
+    assert User._sorted_indexes() == {} and User._text_indexes() == {}
+
+    assert len(User.search_text("user4")) == 11
+    assert tuple(User._text_indexes()) == User.TEXT_ATTRIBUTES
+    assert User._sorted_indexes() == {}
+    users = User.search({'created_at': Range(low=datetime(2000, 1, 1))})
+    assert len(users) == 50 and 'created_at' in User._sorted_indexes()
+    User(email="user4x@hbtn.io").save()
+    assert len(User.search_text("user4")) == 12
+
+
+def test_index_built_while_updating(tmp_path, monkeypatch):
+    """ Values changed while a sorted index is built on first use are
+        not left behind in it under their old value
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(User, 'PERSISTENCE', 'journal')
+    User.load_from_file()
+    User.bulk_create({'email': "user{}@hbtn.io".format(i)}
+                     for i in range(2000))
+    for _ in range(5):
+        User.load_from_file()
+        users = list(User.all())
+        stop = threading.Event()
+
+        def update():
+            year = 0
+            while not stop.is_set():
+                year += 1
+                for user in users[::10]:
+                    user.updated_at = datetime(2000 + year % 50, 1, 1)
+
+        thread = threading.Thread(target=update, daemon=True)
+        thread.start()
+        User.search(order_by='updated_at', limit=1)
+        stop.set()
+        thread.join(10)
+        found = User.search(order_by='updated_at')
+        assert len(found) == len({user.id for user in found}) == 2000
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+""" Tests of the snapshot serializers of the Base store
+"""
+import io
+import os
+from datetime import datetime
+import pytest
+from models.serializers import BinarySerializer
+from models.user import User
+
+
+def stored_state(user: User) -> tuple:
+    """ Return what a snapshot must keep of a user
+    """
+    return (user.id, user.created_at, user.updated_at, user._password,
+            user.email, user.first_name, user.last_name)
+
+
+def sample_users() -> list:
+    """ Return users with every attribute set, or left None
+    """
+    bob = User(email="bob@hbtn.io", first_name="Bob", last_name="Dylan",
+               created_at="2010-03-04T05:06:07")
+    bob.password = "H0lberton"
+    bob.updated_at = datetime(2024, 2, 29, 23, 59, 59)
+    return [bob, User(email="ann@hbtn.io")]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """ Empty User store in a temporary directory
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(User, 'PERSISTENCE', 'journal')
+    User.load_from_file()
+    return tmp_path
+
+
+def test_binary_round_trip_is_exact():
+    """ Timestamps and the password hash read back as they were written
+    """
+    users = sample_users()
+    f = io.BytesIO()
+    BinarySerializer.dump(User, users, f)
+    f.seek(0)
+    loaded = list(BinarySerializer.load(User, f))
+    assert [stored_state(user) for user in loaded] == \
+        [stored_state(user) for user in users]
+    assert loaded[0].is_valid_password("H0lberton")
+
+
+def test_migration_json_binary_json(store, monkeypatch):
+    """ Switching SNAPSHOT_FORMAT to binary and back migrates the store
+        without changing a user
+    """
+    users = sample_users()
+    for user in users:
+        user.save()
+    User.save_to_file()
+    expected = sorted(stored_state(user) for user in User.all())
+
+    for snapshot_format, other in (('binary', 'json'), ('json', 'binary')):
+        monkeypatch.setattr(User, 'SNAPSHOT_FORMAT', snapshot_format)
+        User.load_from_file()
+        assert os.path.exists(User._snapshot_path())
+        assert not os.path.exists(User._snapshot_path(other))
+        User.load_from_file()
+        assert sorted(stored_state(user) for user in User.all()) == expected
+    assert User.search({'email': "bob@hbtn.io"})[0].is_valid_password(
+        "H0lberton")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+""" Tests of the SQLite backend of the Base store
+"""
+from datetime import datetime, timedelta
+import pytest
+import models.base
+from models.query import Range, Suffix
+from models.sqlite_store import SQLiteStore
+from models.user import User
+
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def statements(tmp_path, monkeypatch):
+    """ User store of 100 users in an SQLite database, returning the
+        SQL statements run from then on
+    """
+    store = SQLiteStore(str(tmp_path / "base.sqlite3"))
+    monkeypatch.setitem(models.base.BACKENDS, 'sqlite', store)
+    monkeypatch.setattr(User, 'BACKEND', 'sqlite')
+    User.bulk_create({'email': "user{:03}@hbtn.io".format(i),
+                      'created_at': (START + timedelta(hours=i))
+                      .strftime(models.base.TIMESTAMP_FORMAT)}
+                     for i in range(100))
+    statements = []
+    store._connection(User).set_trace_callback(statements.append)
+    return statements
+
+
+def test_datetime_range_is_matched_in_sql(statements):
+    """ A range of datetimes on created_at is a WHERE condition on its
+        column, to the second
+    """
+    low = START + timedelta(hours=90, microseconds=1)
+    users = User.search({'created_at': Range(low=low)})
+    assert sorted(user.email for user in users) == \
+        ["user{:03}@hbtn.io".format(i) for i in range(91, 100)]
+    assert 'WHERE "created_at" > ' in statements[-1]
+
+    users = User.search({'created_at': Range(high=START, include_high=True)})
+    assert [user.email for user in users] == ["user000@hbtn.io"]
+
+
+@pytest.mark.parametrize('reverse', [False, True])
+def test_order_and_limit_are_pushed_down(statements, reverse):
+    """ With every condition in SQL, ORDER BY and LIMIT are too
+    """
+    users = User.search({'created_at': Range(low=START + timedelta(
+        hours=50))}, order_by='email', reverse=reverse, limit=20)
+    expected = ["user{:03}@hbtn.io".format(i) for i in range(50, 100)]
+    if reverse:
+        expected.reverse()
+    assert [user.email for user in users] == expected[:20]
+    assert "ORDER BY" in statements[-1] and "LIMIT" in statements[-1]
+
+
+def test_limit_waits_for_the_conditions_checked_after(statements):
+    """ A condition SQL cannot match keeps the limit out of SQL, so that
+        the rows it filters out do not shorten the result
+    """
+    users = User.search({'email': Suffix("9@hbtn.io")}, order_by='email',
+                        limit=5)
+    assert [user.email for user in users] == \
+        ["user{:03}@hbtn.io".format(i) for i in (9, 19, 29, 39, 49)]
+    assert "LIMIT" not in statements[-1]
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+""" Tests of the write-behind flusher of the Base store
+"""
+import glob
+import os
+import threading
+import pytest
+from models.base import Base
+from models.user import User
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """ Empty User store in a temporary directory, persisted by group
+        commit
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Base, 'DURABILITY', 'group')
+    User.load_from_file()
+    yield tmp_path
+    User.flush()
+
+
+def test_group_commit_raises_flush_errors(store):
+    """ A writer waiting for a failed flush gets its error instead of
+        waiting forever
+    """
+    User(email="ok@hbtn.io").save()
+    # the snapshot cannot be replaced by a directory
+    os.remove(".db_User.json")
+    os.mkdir(".db_User.json")
+    result = {}
+
+    def save():
+        try:
+            User(email="bob@hbtn.io").save()
+            result['error'] = None
+        except OSError as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=save, daemon=True)
+    thread.start()
+    thread.join(3)
+    assert not thread.is_alive()
+    assert isinstance(result['error'], OSError)
+    assert not glob.glob("*.tmp")
+
+    os.rmdir(".db_User.json")
+    User(email="alice@hbtn.io").save()
+    User.load_from_file()
+    assert sorted(user.email for user in User.all()) == \
+        ["alice@hbtn.io", "bob@hbtn.io", "ok@hbtn.io"]